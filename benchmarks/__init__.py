@@ -0,0 +1,4 @@
+import os
+
+# The rulers are rendered into QImages, no display is needed
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
@@ -0,0 +1,121 @@
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+
+from PyQt5.QtCore import QT_VERSION_STR
+from PyQt5.QtWidgets import QApplication
+
+import rulerModel
+from benchmarks import scenarios
+
+
+def summarize(durations):
+    durations = sorted(d * 1000 for d in durations)
+    return {'median_ms': statistics.median(durations),
+            'mean_ms': statistics.fmean(durations),
+            'min_ms': durations[0],
+            'p95_ms': durations[min(len(durations) - 1, int(len(durations) * 0.95))],
+            'samples': len(durations)}
+
+
+def run(args):
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    rulerModel.load_numpy()
+    zooms = [zoom for zoom in scenarios.ZOOMS if zoom <= args.max_zoom]
+    widths = args.widths or scenarios.WIDTHS
+    cases = {}
+    suites = []
+    if 'paint' in args.suites:
+        suites.append(scenarios.paint_cases(zooms, widths, scenarios.HOMOTHETIES, args.repeat, args.budget))
+    if 'drag' in args.suites:
+        suites.append(scenarios.drag_cases(widths, args.steps))
+    if 'stack' in args.suites:
+        suites.append(scenarios.stack_cases(widths, args.steps))
+    if 'exact' in args.suites:
+        suites.append(scenarios.exact_cases(widths, args.steps))
+    if 'mirror' in args.suites:
+        suites.append(scenarios.mirror_cases(widths, args.steps))
+    if 'function' in args.suites:
+        suites.append(scenarios.function_cases(widths, args.steps))
+    if 'startup' in args.suites:
+        suites.append(scenarios.startup_cases(args.repeat))
+    for suite in suites:
+        for name, durations in suite:
+            cases[name] = summarize(durations)
+            print(f'{name:<70} {cases[name]["median_ms"]:10.3f} ms')
+    app.processEvents()
+    return {'meta': {'python': platform.python_version(),
+                     'qt': QT_VERSION_STR,
+                     'platform': platform.platform(),
+                     'numpy': rulerModel.np is not None,
+                     'time': time.strftime('%Y-%m-%dT%H:%M:%S')},
+            'cases': cases}
+
+
+def compare(baseline, current, tolerance, min_delta):
+    # A case regresses when its median is slower than the baseline by more than
+    # tolerance (relative) and min_delta milliseconds (absolute)
+    regressions = []
+    for name, stats in sorted(current['cases'].items()):
+        reference = baseline['cases'].get(name)
+        if reference is None:
+            continue
+        before, after = reference['median_ms'], stats['median_ms']
+        ratio = after / before if before else float('inf')
+        regressed = after - before > min_delta and ratio > 1 + tolerance
+        if regressed:
+            regressions.append(name)
+        print(f'{name:<70} {before:10.3f} -> {after:10.3f} ms  x{ratio:5.2f}{"  REGRESSION" if regressed else ""}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks',
+                                     description='Time the painting and the interactions of the rulers offscreen.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='run the benchmarks and write the results as JSON')
+    run_parser.add_argument('-o', '--output', default='benchmark.json')
+    suites = ['paint', 'drag', 'stack', 'exact', 'mirror', 'function', 'startup']
+    run_parser.add_argument('--suites', nargs='+', choices=suites, default=suites)
+    run_parser.add_argument('--widths', nargs='+', type=int)
+    run_parser.add_argument('--max-zoom', type=int, default=scenarios.ZOOMS[-1],
+                            help='largest number of visible integers')
+    run_parser.add_argument('--repeat', type=int, default=10, help='samples per paint and startup case')
+    run_parser.add_argument('--budget', type=float, default=2.0, help='seconds after which a case stops sampling')
+    run_parser.add_argument('--steps', type=int, default=50, help='mouse moves per drag direction')
+    run_parser.add_argument('--compare', metavar='BASELINE', help='compare the results with a stored baseline')
+
+    compare_parser = commands.add_parser('compare', help='compare two result files')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+
+    for command in (run_parser, compare_parser):
+        command.add_argument('--tolerance', type=float, default=0.25, help='allowed relative slowdown')
+        command.add_argument('--min-delta', type=float, default=0.1, help='ignored slowdown in milliseconds')
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        current = run(args)
+        with open(args.output, 'w') as f:
+            json.dump(current, f, indent=2)
+        baseline_path = args.compare
+    else:
+        with open(args.current) as f:
+            current = json.load(f)
+        baseline_path = args.baseline
+
+    if baseline_path is not None:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, current, args.tolerance, args.min_delta)
+        if regressions:
+            print(f'{len(regressions)} regression(s)')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
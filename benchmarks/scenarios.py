@@ -0,0 +1,245 @@
+import os
+import subprocess
+import sys
+import time
+
+from PyQt5.QtCore import Qt, QEvent, QPoint
+from PyQt5.QtGui import QImage, QMouseEvent
+from PyQt5.QtWidgets import QApplication
+
+from mainWindow import DoubleRulerWidget, label_cache
+
+ZOOMS = [10 ** n for n in range(1, 8)]
+WIDTHS = [640, 1920, 3840]
+HOMOTHETIES = [2, 2.5]
+
+
+def sample(action, repeat, budget, setup=None):
+    # Time action up to repeat times, stopping early once budget seconds are spent
+    durations = []
+    deadline = time.perf_counter() + budget
+    while len(durations) < repeat and (not durations or time.perf_counter() < deadline):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        action()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def make_double_ruler(width, show_labels, homothetie, state=None):
+    double_ruler = DoubleRulerWidget(state)
+    double_ruler.resize(width, 200)
+    double_ruler.show()
+    QApplication.processEvents()
+    if show_labels:
+        double_ruler.onShowIntegerButton()
+    double_ruler.onShowRulerButton()
+    double_ruler.set_homothetie(homothetie)
+    return double_ruler
+
+
+def clear_caches(double_ruler):
+    label_cache.clear()
+    double_ruler.main_ruler.tick_layer.clear()
+    double_ruler.low_ruler.tick_layer.clear()
+
+
+def renderer(widget):
+    image = QImage(widget.size(), QImage.Format_ARGB32_Premultiplied)
+    return lambda: widget.render(image)
+
+
+def paint_cases(zooms, widths, homotheties, repeat, budget):
+    # Paint latency of each ruler, with empty caches (cold) and after a few frames (warm)
+    for width in widths:
+        for show_labels in (False, True):
+            for homothetie in homotheties:
+                double_ruler = make_double_ruler(width, show_labels, homothetie)
+                rulers = [('low', double_ruler.low_ruler)]
+                if homothetie == homotheties[0]:
+                    rulers.insert(0, ('main', double_ruler.main_ruler))
+                for zoom in zooms:
+                    double_ruler.main_ruler.state.set_range(-zoom / 2, zoom / 2)
+                    for name, ruler in rulers:
+                        paint = renderer(ruler)
+                        case = f'paint/{name}/zoom={zoom}/labels={show_labels}/width={width}'
+                        if name == 'low':
+                            case += f'/homothetie={homothetie}'
+                        yield case + '/cold', sample(paint, repeat, budget,
+                                                     setup=lambda: clear_caches(double_ruler))
+                        paint()
+                        paint()
+                        yield case + '/warm', sample(paint, repeat, budget)
+                double_ruler.close()
+                double_ruler.deleteLater()
+
+
+def send_mouse(widget, event_type, x, button, buttons):
+    QApplication.sendEvent(widget, QMouseEvent(event_type, QPoint(int(x), 5), button, buttons, Qt.NoModifier))
+
+
+def drag(widget, button, points, frame):
+    # Press at the first point, move through the others and release at the last one.
+    # Each move is timed together with the frame it causes.
+    send_mouse(widget, QEvent.MouseButtonPress, points[0], button, button)
+    durations = []
+    for x in points[1:]:
+        start = time.perf_counter()
+        send_mouse(widget, QEvent.MouseMove, x, Qt.NoButton, button)
+        frame()
+        durations.append(time.perf_counter() - start)
+    send_mouse(widget, QEvent.MouseButtonRelease, points[-1], button, Qt.NoButton)
+    return durations
+
+
+def there_and_back(start, end, steps):
+    points = [start + (end - start) * n / steps for n in range(steps + 1)]
+    return points + points[-2::-1]
+
+
+def drag_cases(widths, steps):
+    # Synthetic drags replayed through the mouse handlers, one frame rendered per event
+    for width in widths:
+        for show_labels in (False, True):
+            double_ruler = make_double_ruler(width, show_labels, 2)
+            state = double_ruler.main_ruler.state
+            render = renderer(double_ruler)
+
+            def frame():
+                # One frame per event: the worst case for the frame scheduler
+                state.scheduler.flush()
+                render()
+
+            case = f'labels={show_labels}/width={width}'
+
+            state.set_range(-10, 10)
+            yield 'drag/pan/' + case, drag(double_ruler, Qt.LeftButton,
+                                           there_and_back(width / 2, width / 2 + 300, steps), frame)
+
+            state.set_range(-10, 10)
+            zero = state.zero_offset
+            yield 'drag/zoom/' + case, drag(double_ruler.main_ruler, Qt.RightButton,
+                                            there_and_back(zero + width / 8, zero + width / 3, steps), frame)
+
+            state.set_range(-10, 10)
+            yield 'drag/homothetie/' + case, drag(double_ruler.low_ruler, Qt.RightButton,
+                                                  there_and_back(zero + width / 8, zero + width / 3, steps), frame)
+            double_ruler.close()
+            double_ruler.deleteLater()
+
+
+def stack_cases(widths, steps, sizes=(1, 2, 5, 10)):
+    # Pan frames with a growing stack of homothety rulers under the main one
+    homotheties = [2, 3, 5, -1, 4, 10, -2, 6, 2.5, 7]
+    for width in widths:
+        for size in sizes:
+            double_ruler = make_double_ruler(width, True, homotheties[0])
+            for homothetie in homotheties[1:size]:
+                double_ruler.add_homothety_ruler(homothetie)
+            double_ruler.resize(width, 100 + 120 * size)
+            QApplication.processEvents()
+            state = double_ruler.main_ruler.state
+            render = renderer(double_ruler)
+
+            def frame():
+                state.scheduler.flush()
+                render()
+
+            state.set_range(-10, 10)
+            yield f'stack/pan/rulers={size}/width={width}', drag(double_ruler, Qt.LeftButton,
+                                                                 there_and_back(width / 2, width / 2 + 300, steps),
+                                                                 frame)
+            double_ruler.close()
+            double_ruler.deleteLater()
+
+
+def exact_cases(widths, steps, offsets=(0, 10 ** 15, 10 ** 30)):
+    # Pan frames in float mode and in exact mode around growing offsets, to weigh the
+    # cost of the exact transforms. Offsets beyond 2 ** 53 only make sense when exact.
+    for width in widths:
+        for exact in (False, True):
+            for offset in offsets:
+                if not exact and offset > 2 ** 53:
+                    continue
+                double_ruler = make_double_ruler(width, True, 2)
+                state = double_ruler.main_ruler.state
+                state.set_exact(exact)
+                render = renderer(double_ruler)
+
+                def frame():
+                    state.scheduler.flush()
+                    render()
+
+                state.set_range(offset - 10, offset + 10)
+                mode = 'exact' if exact else 'float'
+                yield f'exact/pan/mode={mode}/offset={offset:.0e}/width={width}', drag(
+                    double_ruler, Qt.LeftButton, there_and_back(width / 2, width / 2 + 300, steps), frame)
+                double_ruler.close()
+                double_ruler.deleteLater()
+
+
+def mirror_cases(widths, steps, counts=(1, 2, 4)):
+    # Pan frames of several views of one state, all at the same width (sharing their
+    # geometry and tiles) or each one narrower than the previous (sharing nothing)
+    for width in widths:
+        for count in counts:
+            for same_size in (True, False) if count > 1 else (True,):
+                double_ruler = make_double_ruler(width, True, 2)
+                state = double_ruler.main_ruler.state
+                views = [double_ruler] + [make_double_ruler(width if same_size else width - 40 * n, True, 2, state)
+                                          for n in range(1, count)]
+                renders = [renderer(view) for view in views]
+
+                def frame():
+                    state.scheduler.flush()
+                    for render in renders:
+                        render()
+
+                state.set_range(-10, 10)
+                case = f'views={count}/same_size={same_size}/width={width}'
+                yield 'mirror/pan/' + case, drag(double_ruler, Qt.LeftButton,
+                                                 there_and_back(width / 2, width / 2 + 300, steps), frame)
+                for view in views:
+                    view.close()
+                    view.deleteLater()
+
+
+def function_cases(widths, steps, texts=('n + 3', 'n²', 'n mod 7', 'n // 2 si n % 2 == 0 sinon 3n + 1')):
+    # Pan frames with the arrows of a function, zoomed out so that every frame maps
+    # integers the previous ones did not
+    from functionMap import FunctionMap
+
+    for width in widths:
+        for text in texts:
+            double_ruler = make_double_ruler(width, False, 1)
+            double_ruler.set_function(FunctionMap(text))
+            QApplication.processEvents()
+            state = double_ruler.main_ruler.state
+            render = renderer(double_ruler)
+
+            def frame():
+                state.scheduler.flush()
+                render()
+
+            state.set_range(-10 ** 4, 10 ** 4)
+            yield f'function/pan/f={text}/width={width}', drag(
+                double_ruler, Qt.LeftButton, there_and_back(width / 2, width / 2 + 300, steps), frame)
+            double_ruler.close()
+            double_ruler.deleteLater()
+
+
+def startup_cases(repeat):
+    # Cold starts of the application in new processes, timed by mainWindow.py --profile-startup
+    script = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'mainWindow.py')
+    steps = {}
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, script, '--profile-startup'],
+                                capture_output=True, text=True, check=True).stdout
+        steps.setdefault('process', []).append(time.perf_counter() - start)
+        for line in output.splitlines():
+            name, value, _ = line.rsplit(maxsplit=2)
+            steps.setdefault(name.replace(' ', '_'), []).append(float(value) / 1000)
+    for name, durations in steps.items():
+        yield 'startup/' + name, durations
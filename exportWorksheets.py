@@ -0,0 +1,217 @@
+import argparse
+import csv
+import json
+import math
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby
+
+from PyQt5.QtCore import QMarginsF, QSizeF, QRectF
+from PyQt5.QtGui import QImage, QPainter, QPageSize, QPdfWriter, QColor
+from PyQt5.QtWidgets import QApplication
+
+import rulerModel
+
+FORMATS = ('png', 'svg', 'pdf')
+FIELDS = ('output', 'format', 'min', 'max', 'homothetie', 'homotheties', 'show_labels', 'show_homothety',
+          'markers', 'special_number', 'width', 'height')
+
+app = None
+
+
+def load_jobs(path):
+    # A JSON list of objects, or a CSV file with a header line naming the FIELDS
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.lower().endswith('.json'):
+            rows = json.load(f)
+        else:
+            rows = [{key: value for key, value in row.items() if value not in (None, '')}
+                    for row in csv.DictReader(f)]
+    return [normalize_job(row, n) for n, row in enumerate(rows, 1)]
+
+
+def normalize_job(row, n):
+    unknown = set(row) - set(FIELDS)
+    if unknown:
+        raise ValueError(f'job {n}: unknown field(s) {", ".join(sorted(unknown))}')
+    if 'output' not in row:
+        raise ValueError(f'job {n}: no output file')
+
+    job = {'output': row['output'],
+           'format': str(row.get('format') or os.path.splitext(row['output'])[1][1:]).lower(),
+           'min': float(row.get('min', -10)),
+           'max': float(row.get('max', 10)),
+           'show_labels': to_bool(row.get('show_labels', True)),
+           'markers': row.get('markers'),
+           'special_number': None if row.get('special_number') is None else float(row['special_number']),
+           'width': int(row.get('width', 1000))}
+    if job['format'] not in FORMATS:
+        raise ValueError(f'job {n}: unknown format {job["format"]!r}, expected one of {", ".join(FORMATS)}')
+    # Caught here rather than in a worker, where the ruler would be drawn on an empty or nan range
+    if not (math.isfinite(job['min']) and math.isfinite(job['max'])):
+        raise ValueError(f'job {n}: min and max must be finite, got {job["min"]} and {job["max"]}')
+    if job['min'] >= job['max']:
+        raise ValueError(f'job {n}: min {job["min"]} must be less than max {job["max"]}')
+
+    homotheties = row.get('homotheties')
+    if isinstance(homotheties, str):
+        homotheties = homotheties.replace(';', ' ').split()
+    if homotheties:
+        job['homotheties'] = [float(h) for h in homotheties]
+        job['show_homothety'] = True
+    else:
+        job['homotheties'] = [float(row.get('homothetie', 1))]
+        job['show_homothety'] = to_bool(row.get('show_homothety', 'homothetie' in row))
+    shown = len(job['homotheties']) if job['show_homothety'] else 0
+    job['height'] = int(row.get('height', 90 + 110 * shown))
+    return job
+
+
+def to_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'oui', 'vrai')
+    return bool(value)
+
+
+def parse_markers(markers):
+    # A list of numbers, 'primes', 'multiples:k' or numbers separated by spaces or semicolons
+    from markerIndex import MarkerIndex
+
+    if isinstance(markers, str):
+        text = markers.strip().lower()
+        if text == 'primes':
+            return MarkerIndex.primes()
+        if text.startswith('multiples:'):
+            return MarkerIndex.multiples(int(text.split(':', 1)[1]))
+        markers = text.replace(';', ' ').split()
+    return MarkerIndex(float(v) for v in markers)
+
+
+def init_worker():
+    # One offscreen QApplication per process
+    global app
+    os.environ['QT_QPA_PLATFORM'] = 'offscreen'
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    rulerModel.load_numpy()
+
+
+def build_rulers(job):
+    from mainWindow import DoubleRulerWidget
+
+    double_ruler = DoubleRulerWidget()
+    double_ruler.resize(job['width'], job['height'])
+    if job['show_labels']:
+        double_ruler.onShowIntegerButton()
+    double_ruler.set_homothetie(job['homotheties'][0])
+    for homothetie in job['homotheties'][1:]:
+        double_ruler.add_homothety_ruler(homothetie)
+    if job['show_homothety']:
+        for ruler in double_ruler.homothety_rulers:
+            ruler.show_ruler = True
+    else:
+        double_ruler.low_ruler.hide()
+    if job['markers']:
+        double_ruler.main_ruler.showMarkers(parse_markers(job['markers']))
+    if job['special_number'] is not None:
+        double_ruler.main_ruler.showSpecialNumber(job['special_number'])
+
+    # Lay the widgets out at the requested size before fixing the visible range
+    double_ruler.show()
+    app.processEvents()
+    double_ruler.main_ruler.state.set_range(job['min'], job['max'])
+    return double_ruler
+
+
+def render_png(job):
+    double_ruler = build_rulers(job)
+    image = QImage(double_ruler.size(), QImage.Format_ARGB32)
+    image.fill(QColor('white'))
+    double_ruler.render(image)
+    double_ruler.close()
+    if not image.save(job['output'], 'PNG'):
+        raise OSError(f'could not write {job["output"]}')
+
+
+def render_svg(job):
+    from PyQt5.QtSvg import QSvgGenerator
+
+    double_ruler = build_rulers(job)
+    generator = QSvgGenerator()
+    generator.setFileName(job['output'])
+    generator.setSize(double_ruler.size())
+    generator.setViewBox(double_ruler.rect())
+    generator.setTitle('Z dans tous ses états')
+    painter = QPainter(generator)
+    double_ruler.render(painter)
+    painter.end()
+    double_ruler.close()
+
+
+def render_pdf(jobs):
+    # All the jobs writing to the same PDF file, one page each
+    writer = QPdfWriter(jobs[0]['output'])
+    writer.setResolution(72)  # One pixel of the widgets is one point
+    painter = None
+    for job in jobs:
+        writer.setPageSize(QPageSize(QSizeF(job['width'], job['height']), QPageSize.Point))
+        writer.setPageMargins(QMarginsF(0, 0, 0, 0))
+        if painter is None:
+            painter = QPainter(writer)
+        else:
+            writer.newPage()
+        double_ruler = build_rulers(job)
+        painter.fillRect(QRectF(0, 0, job['width'], job['height']), QColor('white'))
+        double_ruler.render(painter)
+        double_ruler.close()
+    painter.end()
+
+
+def render_task(task):
+    fmt, jobs = task
+    if fmt == 'pdf':
+        render_pdf(jobs)
+    elif fmt == 'svg':
+        render_svg(jobs[0])
+    else:
+        render_png(jobs[0])
+    return jobs[0]['output'], len(jobs)
+
+
+def tasks_for(jobs):
+    # PNG and SVG jobs are rendered separately, PDF jobs are grouped per file
+    tasks = [(job['format'], [job]) for job in jobs if job['format'] != 'pdf']
+    pdf_jobs = sorted((job for job in jobs if job['format'] == 'pdf'), key=lambda job: job['output'])
+    tasks += [('pdf', list(group)) for _, group in groupby(pdf_jobs, key=lambda job: job['output'])]
+    return tasks
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Render ruler states to PNG, SVG or multi-page PDF worksheets.')
+    parser.add_argument('jobs', help='JSON list or CSV file of ruler states')
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count(),
+                        help='number of rendering processes (default: one per core)')
+    args = parser.parse_args()
+
+    try:
+        jobs = load_jobs(args.jobs)
+    except (OSError, ValueError) as error:
+        sys.exit(f'{args.jobs}: {error}')
+
+    tasks = tasks_for(jobs)
+    failures = 0
+    with ProcessPoolExecutor(max_workers=max(1, min(args.workers, len(tasks) or 1)),
+                             initializer=init_worker) as executor:
+        futures = [(task, executor.submit(render_task, task)) for task in tasks]
+        for task, future in futures:
+            try:
+                output, pages = future.result()
+                print(f'{output} ({pages} page{"s" if pages > 1 else ""})')
+            except Exception as error:
+                failures += 1
+                print(f'{task[1][0]["output"]}: {error}', file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,259 @@
+import ast
+import math
+import re
+from array import array
+from collections import OrderedDict
+
+from rulerModel import INT64_LIMIT, PADDING, load_numpy
+
+np = load_numpy()
+
+CHUNK = 1024  # Multiples of the tick interval evaluated together
+CHUNKS = 256  # Evaluated chunks kept by a function
+MAX_EXPONENT = 64
+
+# Notations accepted besides the Python ones: symbols, then words and implicit products,
+# the French words of a piecewise rule included
+SYMBOLS = [('−', '-'), ('×', '*'), ('·', '*'), ('÷', '//'), ('^', '**'), ('²', '**2'), ('³', '**3'),
+           ('≤', '<='), ('≥', '>='), ('≠', '!=')]
+WORDS = [(r'\bmod\b', '%'), (r'\bsinon\b', 'else'), (r'\bsi\b', 'if'), (r'\bet\b', 'and'), (r'\bou\b', 'or'),
+         (r'(\d)\s*(n\b|\()', r'\1*\2')]
+
+BINARY = {ast.Add: lambda a, b: a + b, ast.Sub: lambda a, b: a - b, ast.Mult: lambda a, b: a * b,
+          ast.FloorDiv: lambda a, b: a // b, ast.Mod: lambda a, b: a % b, ast.Pow: lambda a, b: a ** b}
+COMPARE = {ast.Eq: lambda a, b: a == b, ast.NotEq: lambda a, b: a != b, ast.Lt: lambda a, b: a < b,
+           ast.LtE: lambda a, b: a <= b, ast.Gt: lambda a, b: a > b, ast.GtE: lambda a, b: a >= b}
+
+
+class PythonOps:
+    # One integer at a time, exactly. The branches of a piecewise rule are only
+    # evaluated when taken, so that n // n if n != 0 else 0 is defined at 0.
+    @staticmethod
+    def where(test, body, orelse):
+        return lambda n: body(n) if test(n) else orelse(n)
+
+    @staticmethod
+    def all(values):
+        return all(values)
+
+    @staticmethod
+    def any(values):
+        return any(values)
+
+    logical_not = staticmethod(lambda a: not a)
+    absolute = staticmethod(abs)
+    minimum = staticmethod(min)
+    maximum = staticmethod(max)
+
+
+class NumpyOps:
+    # A whole array at once, both branches of a piecewise rule included
+    @staticmethod
+    def where(test, body, orelse):
+        return lambda n: np.where(test(n), body(n), orelse(n))
+
+    @staticmethod
+    def all(values):
+        return np.logical_and.reduce(values)
+
+    @staticmethod
+    def any(values):
+        return np.logical_or.reduce(values)
+
+    logical_not = staticmethod(lambda a: np.logical_not(a))
+    absolute = staticmethod(lambda a: np.absolute(a))
+    minimum = staticmethod(lambda a, b: np.minimum(a, b))
+    maximum = staticmethod(lambda a, b: np.maximum(a, b))
+
+
+def normalize(text):
+    text = text.strip()
+    for symbol, replacement in SYMBOLS:
+        text = text.replace(symbol, replacement)
+    for pattern, replacement in WORDS:
+        text = re.sub(pattern, replacement, text)
+    return text
+
+
+def offset(image, anchor):
+    # Distance from the anchor as a float, infinite beyond the floats
+    try:
+        return float(image - anchor)
+    except OverflowError:
+        return math.copysign(math.inf, image - anchor)
+
+
+def build(node, ops):
+    # A function of n computing the expression under node with ops, see PythonOps and NumpyOps
+    if isinstance(node, ast.Expression):
+        return build(node.body, ops)
+    if isinstance(node, ast.Name) and node.id == 'n':
+        return lambda n: n
+    if isinstance(node, ast.Constant) and type(node.value) is int:
+        value = node.value
+        return lambda n: value
+    if isinstance(node, ast.BinOp) and type(node.op) in BINARY:
+        if isinstance(node.op, ast.Pow) and not (isinstance(node.right, ast.Constant) and
+                                                 type(node.right.value) is int and
+                                                 0 <= node.right.value <= MAX_EXPONENT):
+            raise ValueError(f'the exponent must be an integer between 0 and {MAX_EXPONENT}')
+        operator, left, right = BINARY[type(node.op)], build(node.left, ops), build(node.right, ops)
+        return lambda n: operator(left(n), right(n))
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd, ast.Not)):
+        operand = build(node.operand, ops)
+        if isinstance(node.op, ast.USub):
+            return lambda n: -operand(n)
+        if isinstance(node.op, ast.Not):
+            return lambda n: ops.logical_not(operand(n))
+        return operand
+    if isinstance(node, ast.Compare) and all(type(op) in COMPARE for op in node.ops):
+        operands = [build(operand, ops) for operand in [node.left] + node.comparators]
+        operators = [COMPARE[type(op)] for op in node.ops]
+        if len(operators) == 1:
+            operator, left, right = operators[0], operands[0], operands[1]
+            return lambda n: operator(left(n), right(n))
+        return lambda n: ops.all([operator(left(n), right(n))
+                                  for operator, left, right in zip(operators, operands, operands[1:])])
+    if isinstance(node, ast.BoolOp):
+        values = [build(value, ops) for value in node.values]
+        combine = ops.all if isinstance(node.op, ast.And) else ops.any
+        return lambda n: combine([value(n) for value in values])
+    if isinstance(node, ast.IfExp):
+        return ops.where(build(node.test, ops), build(node.body, ops), build(node.orelse, ops))
+    if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords and
+            (node.func.id, len(node.args)) in (('abs', 1), ('min', 2), ('max', 2))):
+        function = {'abs': ops.absolute, 'min': ops.minimum, 'max': ops.maximum}[node.func.id]
+        args = [build(arg, ops) for arg in node.args]
+        return lambda n: function(*[arg(n) for arg in args])
+    raise ValueError(f'{ast.unparse(node)!r} is not allowed')
+
+
+class FunctionMap:
+    # An integer function of n drawn as arrows from the main ruler to a second one, see
+    # mainWindow.FunctionRuler. It is written like Python (n + 3, n ** 2, n % 5, -n,
+    # n // 2 if n % 2 == 0 else 3 * n + 1) or with the usual notations (n², n mod 5,
+    # si/sinon). The images of the multiples of a tick interval are evaluated by chunks
+    # of CHUNK over arrays, and kept, so that panning only evaluates the chunks entering
+    # the view. NumPy evaluates them in int64 and in float64 at once: where both disagree
+    # int64 has overflowed, and these images are evaluated again with Python integers.
+
+    def __init__(self, text):
+        self.text = text.strip()
+        self.source = normalize(text)
+        try:
+            tree = ast.parse(self.source, mode='eval')
+        except SyntaxError as error:
+            raise ValueError(f'invalid syntax: {error.msg}') from None
+        self.scalar = build(tree, PythonOps)
+        self.vector = build(tree, NumpyOps) if np is not None else None
+        self.chunks = OrderedDict()
+        self.last_key = None
+        self.last_arrows = None
+
+    def __call__(self, n):
+        # Image of a single integer, None where it is not defined
+        try:
+            return int(self.scalar(n))
+        except (ZeroDivisionError, OverflowError, ValueError):
+            return None
+
+    def images(self, values):
+        # Images of a range of integers, from the cached chunks. The ticks of a ruler are
+        # multiples of their interval, so residue is 0 for them.
+        if not values:
+            return np.zeros(0, dtype=np.int64) if np is not None else []
+        step = values.step
+        residue = values[0] % step
+        first, last = values[0] // step, values[-1] // step
+        parts = []
+        for chunk in range(first // CHUNK, last // CHUNK + 1):
+            images = self.chunk(step, residue, chunk)
+            start = max(first - chunk * CHUNK, 0)
+            stop = min(last - chunk * CHUNK + 1, CHUNK)
+            parts.append(images[start:stop])
+        if np is not None:
+            return np.concatenate(parts) if len(parts) > 1 else parts[0]
+        return [image for part in parts for image in part]
+
+    def chunk(self, step, residue, chunk):
+        key = (step, residue, chunk)
+        images = self.chunks.get(key)
+        if images is not None:
+            self.chunks.move_to_end(key)
+            return images
+        values = range(chunk * CHUNK * step + residue, (chunk + 1) * CHUNK * step + residue, step)
+        if np is None:
+            images = [self(n) for n in values]
+        elif max(abs(values[0]), abs(values[-1])) >= INT64_LIMIT:
+            images = self.exact_images(values)
+        else:
+            images = self.evaluate(np.arange(chunk * CHUNK, (chunk + 1) * CHUNK, dtype=np.int64) * step + residue)
+        self.chunks[key] = images
+        if len(self.chunks) > CHUNKS:
+            self.chunks.popitem(last=False)
+        return images
+
+    def exact_images(self, values):
+        images = np.empty(len(values), dtype=object)
+        images[:] = [self(n) for n in values]
+        return images
+
+    def evaluate(self, ns):
+        try:
+            with np.errstate(all='ignore'):
+                exact = np.broadcast_to(np.asarray(self.vector(ns)), ns.shape).astype(np.int64)
+                rounded = np.broadcast_to(np.asarray(self.vector(ns.astype(float))), ns.shape).astype(float)
+        except OverflowError:
+            # A constant beyond int64
+            return self.exact_images(ns.tolist())
+        wrong = np.flatnonzero(exact.astype(float) != rounded)
+        if len(wrong) == 0:
+            return exact
+        images = exact.astype(object)
+        for k in wrong.tolist():
+            images[k] = self(int(ns[k]))
+        if all(image is not None and abs(image) < INT64_LIMIT for image in images[wrong]):
+            return images.astype(np.int64)
+        return images
+
+    def arrows(self, model, values):
+        # Pixel positions of the images of values on a ruler of model, within its ends, and
+        # whether each image is visible. Undefined images are nan, or None without NumPy.
+        key = (model.values(), values)
+        if key == self.last_key:
+            return self.last_arrows
+        images = self.images(values)
+        anchor, x_anchor = model.anchor()
+        unit_length = model.unit_length
+        left, right = PADDING, model.width - PADDING
+        if np is not None:
+            if images.dtype == object or abs(anchor) >= INT64_LIMIT:
+                offsets = np.array([math.nan if image is None else offset(image, anchor) for image in images])
+            else:
+                offsets = (images - anchor).astype(float)
+            xs = offsets * unit_length + x_anchor
+            inside = (xs >= left) & (xs <= right)
+            xs = np.clip(xs, left, right)
+        else:
+            xs = [math.nan if image is None else x_anchor + offset(image, anchor) * unit_length for image in images]
+            inside = [left <= x <= right for x in xs]
+            xs = array('d', [min(max(x, left), right) for x in xs])
+        self.last_key, self.last_arrows = key, (xs, inside)
+        return xs, inside
+
+
+FUNCTIONS = 16  # Functions kept with their chunks, so that going back to one is free
+functions = OrderedDict()
+
+
+def function_map(text):
+    # The FunctionMap of text, shared with the earlier entries of the same function
+    key = normalize(text)
+    function = functions.get(key)
+    if function is not None:
+        functions.move_to_end(key)
+        return function
+    function = functions[key] = FunctionMap(text)
+    if len(functions) > FUNCTIONS:
+        functions.popitem(last=False)
+    return function
@@ -0,0 +1,264 @@
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from fractions import Fraction
+
+from PyQt5.QtCore import Qt, QEvent, QObject, QPoint
+from PyQt5.QtGui import QImage, QKeyEvent, QMouseEvent
+from PyQt5.QtWidgets import QApplication, QPushButton, QWidget
+
+TRACE_VERSION = 1
+MOUSE_EVENTS = {QEvent.MouseButtonPress: 'press', QEvent.MouseMove: 'move', QEvent.MouseButtonRelease: 'release',
+                QEvent.MouseButtonDblClick: 'double_click'}
+EVENT_TYPES = {name: event_type for event_type, name in MOUSE_EVENTS.items()}
+# Widgets opening a modal dialog, which would wait for a user during a replay
+MODAL_WIDGETS = ('button:Charger un fichier CSV',)
+
+
+def widget_path(window, widget):
+    # Name of a widget of the window in a trace: the attribute holding it, the index of
+    # a homothety ruler or the text of a button. None for the widgets that are not traced.
+    if widget is window:
+        return 'window'
+    double_ruler = window.doubleRuler
+    for owner, prefix in ((window, ''), (double_ruler, 'doubleRuler.')):
+        for name, value in vars(owner).items():
+            if value is widget:
+                return prefix + name
+    if widget in double_ruler.homothety_rulers:
+        return f'doubleRuler.homothety_rulers.{double_ruler.homothety_rulers.index(widget)}'
+    if isinstance(widget, QPushButton):
+        return 'button:' + widget.text()
+    return None
+
+
+def find_widget(window, path):
+    if path == 'window':
+        return window
+    if path.startswith('button:'):
+        text = path[len('button:'):]
+        return next(button for button in window.findChildren(QPushButton) if button.text() == text)
+    owner = window
+    for name in path.split('.'):
+        owner = owner[int(name)] if name.isdigit() else getattr(owner, name)
+    return owner
+
+
+class TraceRecorder(QObject):
+    # Writes the mouse, key and resize events received by the widgets of a RulerWindow
+    # to a JSONL trace: a header line, then one line per event with its time in ms since
+    # the start. An event ignored by a ruler and passed on to its parent is written once.
+
+    def __init__(self, window, path):
+        super().__init__()
+        self.window = window
+        self.file = open(path, 'w')
+        self.start = time.perf_counter()
+        self.last_event = None
+        self.write({'version': TRACE_VERSION, 'width': window.width(), 'height': window.height()})
+        QApplication.instance().installEventFilter(self)
+
+    def write(self, record):
+        self.file.write(json.dumps(record, separators=(',', ':')) + '\n')
+
+    def close(self):
+        QApplication.instance().removeEventFilter(self)
+        self.file.close()
+
+    def eventFilter(self, obj, event):
+        event_type = event.type()
+        if event_type not in MOUSE_EVENTS and event_type not in (QEvent.KeyPress, QEvent.Resize):
+            return False
+        if not isinstance(obj, QWidget) or obj.window() is not self.window:
+            return False
+        if event_type == QEvent.Resize:
+            if obj is self.window:
+                self.write({'t': self.elapsed(), 'type': 'resize',
+                            'width': event.size().width(), 'height': event.size().height()})
+            return False
+        path = widget_path(self.window, obj)
+        if path is None:
+            return False
+        if event_type == QEvent.KeyPress:
+            key = (event_type, event.key(), event.timestamp(), event.isAutoRepeat())
+            record = {'type': 'key', 'key': event.key(), 'text': event.text()}
+        else:
+            key = (event_type, obj.mapToGlobal(event.pos()), event.buttons(), event.timestamp())
+            record = {'type': MOUSE_EVENTS[event_type], 'x': event.x(), 'y': event.y(),
+                      'button': int(event.button()), 'buttons': int(event.buttons())}
+        if key == self.last_event:
+            return False
+        self.last_event = key
+        if event_type == QEvent.MouseButtonPress and path in MODAL_WIDGETS:
+            print(f'{path} opens a file dialog, the trace will not replay', file=sys.stderr)
+        self.write({'t': self.elapsed(), 'widget': path, **record, 'modifiers': int(event.modifiers())})
+        return False
+
+    def elapsed(self):
+        return round((time.perf_counter() - self.start) * 1000, 3)
+
+
+def load_trace(path):
+    with open(path) as f:
+        header, *records = [json.loads(line) for line in f if line.strip()]
+    if header.get('version') != TRACE_VERSION:
+        raise ValueError(f'unsupported trace version {header.get("version")!r}')
+    for n, record in enumerate(records, 1):
+        if record.get('widget') in MODAL_WIDGETS:
+            raise ValueError(f'event {n} is on {record["widget"]}, whose file dialog cannot be replayed')
+    return header, records
+
+
+def make_event(record):
+    modifiers = Qt.KeyboardModifiers(record.get('modifiers', 0))
+    if record['type'] == 'key':
+        return QKeyEvent(QEvent.KeyPress, record['key'], modifiers, record['text'])
+    return QMouseEvent(EVENT_TYPES[record['type']], QPoint(record['x'], record['y']),
+                       Qt.MouseButton(record['button']), Qt.MouseButtons(record['buttons']), modifiers)
+
+
+def ruler_state(window):
+    # Final state of the rulers, the same after every replay of a trace
+    double_ruler = window.doubleRuler
+    main_ruler = double_ruler.main_ruler
+    state = dict(zip(('zero_offset', 'unit_length', 'homothetie', 'width', 'origin', 'exact'),
+                     main_ruler.state.model.values()))
+    special_number = main_ruler.special_number
+    state.update(homotheties=[ruler.homothetie for ruler in double_ruler.homothety_rulers],
+                 show_labels=double_ruler.show_labels,
+                 show_homothety=double_ruler.low_ruler.show_ruler,
+                 special_number=str(special_number) if isinstance(special_number, Fraction) else special_number,
+                 markers=None if main_ruler.markers is None else len(main_ruler.markers),
+                 function=None if double_ruler.function_ruler is None else double_ruler.function_ruler.function.text)
+    return state
+
+
+def replay(header, records, realtime=False):
+    # Drive a new RulerWindow through the recorded events. At full speed every event is
+    # followed by its frame and the animations it started end at once; in real time the
+    # events keep their recorded timing and the frame scheduler coalesces them as it did
+    # during the recording. The latency of an event is the time it took to handle it and
+    # to process what it left pending.
+    from mainWindow import RulerWindow
+    from paintProfiler import summarize
+
+    app = QApplication.instance()
+    window = RulerWindow()
+    window.resize(header['width'], header['height'])
+    window.show()
+    while window.deferred_pending:
+        app.processEvents()
+    state = window.doubleRuler.main_ruler.state
+
+    latencies = []
+    start = time.perf_counter()
+    for record in records:
+        if realtime:
+            while time.perf_counter() - start < record['t'] / 1000:
+                app.processEvents()
+                time.sleep(0.0005)
+        event_start = time.perf_counter()
+        if record['type'] == 'resize':
+            window.resize(record['width'], record['height'])
+        else:
+            QApplication.sendEvent(find_widget(window, record['widget']), make_event(record))
+        if not realtime:
+            state.scheduler.flush()
+            window.doubleRuler.animator.finish()
+        app.processEvents()
+        latencies.append((time.perf_counter() - event_start) * 1000)
+    # The transitions still running in real time land on their target, as at full speed
+    window.doubleRuler.animator.finish()
+    state.scheduler.flush()
+    app.processEvents()
+
+    # Render the final frame, so that a broken trace fails here rather than unnoticed
+    image = QImage(window.size(), QImage.Format_ARGB32)
+    window.render(image)
+    report = {'events': len(records),
+              'duration_ms': (time.perf_counter() - start) * 1000,
+              'latency': summarize(latencies),
+              'state': ruler_state(window)}
+    window.close()
+    return report
+
+
+def compare_states(expected, actual, rel_tol=1e-9):
+    # Names of the values of the final state that differ, floats up to rel_tol
+    differences = []
+    for name, value in expected.items():
+        other = actual.get(name)
+        if isinstance(value, float) and isinstance(other, (int, float)):
+            if not math.isclose(value, other, rel_tol=rel_tol, abs_tol=rel_tol):
+                differences.append(name)
+        elif value != other:
+            differences.append(name)
+    return differences
+
+
+def record(path):
+    from mainWindow import RulerWindow
+
+    app = QApplication(sys.argv[:1])
+    window = RulerWindow()
+    window.show()
+    recorder = TraceRecorder(window, path)
+    app.aboutToQuit.connect(recorder.close)
+    print(f'Recording to {path}, close the window to stop')
+    return app.exec_()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Record the interactions with the rulers and replay them headless.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    record_parser = commands.add_parser('record', help='run the application and record a trace')
+    record_parser.add_argument('trace')
+
+    replay_parser = commands.add_parser('replay', help='replay a trace offscreen and report the final state')
+    replay_parser.add_argument('trace')
+    replay_parser.add_argument('--realtime', action='store_true', help='keep the recorded timing of the events')
+    replay_parser.add_argument('-o', '--output', help='write the report as JSON')
+    replay_parser.add_argument('--expect', metavar='REPORT',
+                               help='fail when the final state differs from the one of this report')
+    replay_parser.add_argument('--max-p95', type=float, metavar='MS',
+                               help='fail when the 95th percentile of the event latency is above MS')
+
+    args = parser.parse_args()
+    if args.command == 'record':
+        sys.exit(record(args.trace))
+
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    app = QApplication(sys.argv[:1])
+    try:
+        header, records = load_trace(args.trace)
+    except (OSError, ValueError) as error:
+        sys.exit(f'{args.trace}: {error}')
+    report = replay(header, records, args.realtime)
+    latency = report['latency']
+    print(f'{report["events"]} events in {report["duration_ms"]:.1f} ms, '
+          f'latency median {latency.get("median_ms", 0):.3f} ms, p95 {latency.get("p95_ms", 0):.3f} ms')
+    print(json.dumps(report['state']))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    failures = []
+    if args.expect:
+        with open(args.expect) as f:
+            differences = compare_states(json.load(f)['state'], report['state'])
+        if differences:
+            failures.append(f'final state differs: {", ".join(differences)}')
+    if args.max_p95 is not None and latency.get('p95_ms', 0) > args.max_p95:
+        failures.append(f'p95 latency {latency["p95_ms"]:.3f} ms above {args.max_p95} ms')
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    app.processEvents()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,26 +1,706 @@
+import time
+STARTED = time.perf_counter()  # Before the imports, for --profile-startup
+
+import json
+import math
 import sys
-from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QFrame, QLabel, QHBoxLayout, QPushButton, QLineEdit
-from PyQt5.QtGui import QPainter, QPen, QDoubleValidator
-from PyQt5.QtCore import Qt, QEvent, pyqtSignal
+from PyQt5 import sip
+from collections import OrderedDict, deque
+from fractions import Fraction
+from PyQt5.QtWidgets import (QApplication, QWidget, QVBoxLayout, QFrame, QLabel, QHBoxLayout, QPushButton, QLineEdit,
+                             QFileDialog, QShortcut)
+from PyQt5.QtGui import (QPainter, QPaintEngine, QPen, QPixmap, QFontMetrics, QDoubleValidator, QIntValidator,
+                         QGuiApplication, QKeySequence, QRegion)
+from PyQt5.QtCore import (Qt, QEvent, QObject, QLineF, QRect, QTimer, QVariantAnimation, QEasingCurve,
+                          pyqtSignal)
+QT_IMPORTED = time.perf_counter()
+
+from rulerModel import (PADDING, RECENTER_WIDTHS, UNLABELLED_WIDTH, FrameGeometry, RulerModel, load_numpy,
+                        nonzero_homothetie, split_offset, tick_positions, tier_positions)
+IMPORTED = time.perf_counter()
+
+TILE_WIDTH = 256
+TILE_ANCHOR_LIMIT = 2 ** 31  # Farthest the anchor of the tiles may be from the view, in pixels
+VECTOR_ENGINES = (QPaintEngine.SVG, QPaintEngine.Pdf, QPaintEngine.Picture, QPaintEngine.PostScript)
+LINES_PER_CALL = 4096
+PAINT_PROFILE = 'paint-profile.json'  # Written on exit by --profile-paint
+TIER_LENGTHS = (0.6, 0.35)  # Length of the minor and sub-minor ticks, relative to the major ones
+TILE_MARGIN = TILE_WIDTH // 2  # Pixels drawn around a tile, for the labels spilling over it
+TILE_SETS = 16  # Tile sets kept by a RulerState for its rulers, see TickLayer
+TRANSITION_DURATION = 600  # Default length of the animated transitions, in ms
+LESSON_STEPS = ('homothetie', 'range', 'number', 'pause', 'duration')
+
+
+def integer_label(i):
+    if i > 0:
+        return '+' + str(i)
+    else:
+        return str(i)
+
+
+def prod_label(i, homothetie):
+    if i > 0:
+        return f'(+{i})x{homothetie:.0f}'
+    if i == 0:
+        return f'{i}x{homothetie:.0f}'
+    else:
+        return f'({i})x{homothetie:.0f}'
+
+
+class LabelCache:
+    # Formatted labels and their width in pixels, keyed by (value, homothetie, font).
+    # homothetie is None for the integer labels. The least recently used entries are
+    # dropped beyond max_size; hits and misses tell how well it works over a session.
+
+    def __init__(self, max_size=4096):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.metrics = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, value, homothetie, font):
+        key = (value, homothetie, font.key())
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry
+        self.misses += 1
+        metrics = self.metrics.get(key[2])
+        if metrics is None:
+            metrics = self.metrics[key[2]] = QFontMetrics(font)
+        text = integer_label(value) if homothetie is None else prod_label(value, homothetie)
+        entry = self.entries[key] = (text, metrics.width(text))
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+        return entry
+
+    def set_max_size(self, max_size):
+        self.max_size = max_size
+        while len(self.entries) > max_size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def info(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'size': len(self.entries), 'max_size': self.max_size}
+
+
+label_cache = LabelCache()
+
+
+class TickLayer:
+    # Ticks and labels of a ruler rendered into QPixmap tiles laid along the axis
+    # relative to the anchor of the ruler (its zero unless exact). Panning only moves
+    # the anchor, so the tiles stay valid and are blitted shifted: only the tiles
+    # entering the view are drawn. The tiles are kept by the RulerState, so the
+    # rulers of the windows mirroring it at the same size share them.
+
+    def __init__(self, ruler):
+        self.ruler = ruler
+        self.key = None
+        self.tiles = {}
+
+    def clear(self):
+        self.key = None
+        self.tiles.clear()
+
+    def key_for(self, anchor, phase):
+        # Everything the tiles depend on, the same for equal rulers of mirrored windows
+        ruler = self.ruler
+        return ((type(ruler), ruler.tick_length, ruler.line_thickness, anchor, phase) + ruler.cache_key() +
+                (ruler.width(), ruler.height(), ruler.devicePixelRatioF()))
+
+    def paint(self, painter):
+        ruler = self.ruler
+        step = ruler.tick_interval
+        first = ruler.min_integer + ((-ruler.min_integer) % step)
+        count = len(range(first, ruler.max_integer + 1, step))
+        tiers = ruler.tick_tiers()
+        if count == 0 and not tiers:
+            return
 
+        if painter.paintEngine().type() in VECTOR_ENGINES:
+            # SVG and PDF exports keep the ticks as vectors
+            ruler.draw_tiers(painter, ruler.visible_tiers())
+            ruler.draw_ticks(painter, *ruler.visible_ticks())
+            return
 
-class RulerWidget(QWidget):
+        anchor, x_anchor = ruler.model.anchor(ruler.scale)
+        if abs(x_anchor) > TILE_ANCHOR_LIMIT:
+            # The tiles are laid out from the anchor, which is too far for that outside
+            # of exact mode: draw directly
+            ruler.draw_tiers(painter, ruler.visible_tiers())
+            ruler.draw_ticks(painter, *ruler.visible_ticks())
+            return
+        # The tiles start at the pixel of the anchor and place the ticks from the fraction
+        # left, see rulerModel.split_offset. Panning moves the anchor by whole pixels.
+        origin, phase = split_offset(x_anchor)
+
+        # Show the labels of the visible ticks only, and their ticks with the minor ones
+        # along the whole ruler: the labels of the ticks beyond its ends stay hidden
+        top, bottom = ruler.tick_band()
+        band = QRect(0, top, ruler.width(), bottom - top)
+        left, right = math.inf, -math.inf
+        region = QRegion()
+        if count:
+            last = first + (count - 1) * step
+            x_first = origin + math.floor(phase + (first - anchor) * ruler.unit_length)
+            x_last = origin + math.floor(phase + (last - anchor) * ruler.unit_length)
+            x_first, x_last = min(x_first, x_last), max(x_first, x_last)
+            labels = QRect(x_first - ruler.tick_extent(first), 0,
+                           x_last - x_first + ruler.tick_extent(first) + ruler.tick_extent(last), ruler.height())
+            region = QRegion(labels).subtracted(QRegion(band))
+            left, right = x_first - ruler.line_thickness - 1, x_last + ruler.line_thickness + 1
+        if tiers:
+            left, right = min(left, PADDING), max(right, ruler.width() - PADDING + 1)
+        region = region.united(QRegion(QRect(left, top, right - left, bottom - top)))
+        bounds = region.boundingRect()
+        first_tile = (bounds.left() - origin) // TILE_WIDTH
+        last_tile = (bounds.right() + 1 - origin) // TILE_WIDTH
+
+        painter.save()
+        painter.setClipRegion(region)
+        key = self.key_for(anchor, phase)
+        if key != self.key:
+            # Zooming changes the key on every frame, only cache once it is stable,
+            # or right away when another window already did. Until then the ticks
+            # are drawn in place, see draw_span.
+            self.key = key
+            self.tiles, created = ruler.state.tiles_for(key)
+            if created:
+                painter.translate(origin, 0)
+                self.draw_span(painter, bounds.left() - origin - TILE_MARGIN, bounds.right() - origin + TILE_MARGIN,
+                               anchor, phase)
+                painter.restore()
+                return
+        for k in range(first_tile, last_tile + 1):
+            tile = self.tiles.get(k)
+            if tile is None:
+                tile = self.tiles[k] = self.render_tile(k, anchor, phase)
+            painter.drawPixmap(origin + k * TILE_WIDTH, 0, tile)
+        painter.restore()
+
+        # Keep the tiles around the view so that panning back is free as well
+        kept = last_tile - first_tile + 1
+        for k in [k for k in self.tiles if not first_tile - kept <= k <= last_tile + kept]:
+            del self.tiles[k]
+
+    def render_tile(self, k, anchor, phase):
+        ruler = self.ruler
+        dpr = ruler.devicePixelRatioF()
+        tile = QPixmap(int(TILE_WIDTH * dpr), int(ruler.height() * dpr))
+        tile.setDevicePixelRatio(dpr)
+        tile.fill(Qt.transparent)
+
+        # Ticks whose label may spill over the tile are drawn too, the pixmap clips them
+        painter = QPainter(tile)
+        painter.translate(-k * TILE_WIDTH, 0)
+        self.draw_span(painter, k * TILE_WIDTH - TILE_MARGIN, (k + 1) * TILE_WIDTH + TILE_MARGIN, anchor, phase)
+        painter.end()
+        return tile
+
+    def draw_span(self, painter, left, right, anchor, phase):
+        # The ticks between the pixels left and right from the anchor pixel, at x = 0 of
+        # painter. The tiles and the first frame of a key are drawn this way, so both
+        # show the same picture.
+        ruler = self.ruler
+        bounds = sorted(((left - phase) / ruler.unit_length, (right - phase) / ruler.unit_length))
+        step = abs(ruler.tick_interval)
+        start = math.ceil(bounds[0])
+        start += (-anchor - start) % step
+        stop = math.floor(bounds[1]) + 1
+        _, xs = tick_positions(start, stop, step, phase, ruler.unit_length)
+        tiers = [tier_positions(anchor, *bounds, tier_step, parent, phase, ruler.unit_length)
+                 for tier_step, parent in ruler.tick_tiers()]
+
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setFont(ruler.font())
+        ruler.draw_tiers(painter, tiers)
+        ruler.draw_ticks(painter, range(anchor + start, anchor + stop, step), xs)
+
+
+class FrameScheduler(QObject):
+    # Runs the latest callback scheduled under each key once per frame. Mouse handlers
+    # only record the change they want, so however many events arrive in a frame the
+    # state is updated and repainted once. The timer stops when nothing is pending.
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.pending = {}
+        screen = QGuiApplication.primaryScreen()
+        refresh_rate = screen.refreshRate() if screen is not None else 0
+        self.interval = 1000 / (refresh_rate if refresh_rate > 0 else 60)
+        self.timer = QTimer(self)
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.timer.setInterval(round(self.interval))
+        self.timer.timeout.connect(self.on_frame)
+        self.last_frame = None
+        self.frames = 0
+        self.late_frames = 0
+        self.dropped_frames = 0
+        self.coalesced = 0
+
+    def schedule(self, key, callback):
+        if key in self.pending:
+            self.coalesced += 1
+        self.pending[key] = callback
+        if not self.timer.isActive():
+            self.last_frame = time.perf_counter()
+            self.timer.start()
+
+    def flush(self):
+        pending, self.pending = self.pending, {}
+        for callback in pending.values():
+            callback()
+
+    def on_frame(self):
+        now = time.perf_counter()
+        periods = (now - self.last_frame) * 1000 / self.interval
+        self.last_frame = now
+        if not self.pending:
+            self.timer.stop()
+            return
+        self.frames += 1
+        if periods > 1.5:
+            self.late_frames += 1
+            self.dropped_frames += round(periods) - 1
+        self.flush()
+
+    def stats(self):
+        return {'frames': self.frames, 'late_frames': self.late_frames,
+                'dropped_frames': self.dropped_frames, 'coalesced_events': self.coalesced}
 
-    value_changed = pyqtSignal()
 
-    def __init__(self, min_value=0, max_value=100, tick_length=10, line_thickness=2,
-                 zero_offset=None, unit_length=None):
+class StartupProfile(QObject):
+    # Durations of the startup steps, printed once the main ruler has painted its
+    # first frame and NumPy is loaded. The application then quits.
+
+    def __init__(self):
         super().__init__()
-        if zero_offset is None:
-            self.min_value = min_value
-            self.max_value = max_value
-            self.unit_length = (self.width() - 40) / (self.max_value - self.min_value)
-            self.zero_offset = 20 - self.min_value * self.unit_length
+        self.marks = [('qt imports', QT_IMPORTED), ('module imports', IMPORTED)]
+        self.window = None
+
+    def mark(self, name):
+        self.marks.append((name, time.perf_counter()))
+
+    def watch(self, window):
+        self.window = window
+        window.doubleRuler.main_ruler.installEventFilter(self)
+
+    def eventFilter(self, obj, event):
+        if event.type() != QEvent.Paint:
+            return False
+        # Paint right away to time the end of the first frame
+        obj.removeEventFilter(self)
+        obj.event(event)
+        self.mark('first frame')
+        QTimer.singleShot(0, self.report)
+        return True
+
+    def report(self):
+        if self.window.deferred_pending:
+            QTimer.singleShot(0, self.report)
+            return
+        self.mark('deferred loading')
+        previous = STARTED
+        for name, t in self.marks:
+            print(f'{name:<24}{(t - previous) * 1000:10.1f} ms')
+            previous = t
+        first_frame = dict(self.marks)['first frame']
+        print(f'{"time to first frame":<24}{(first_frame - STARTED) * 1000:10.1f} ms')
+        QApplication.instance().quit()
+
+
+def instrument(profiler):
+    # What --profile-paint measures, see paintProfiler.PaintProfiler
+    mouse_handlers = ('mousePressEvent', 'mouseMoveEvent', 'mouseReleaseEvent')
+    for cls in (RulerWidget, BottomRuler):
+        profiler.wrap_paint(cls, frame=cls is RulerWidget)
+        profiler.wrap_calls(cls, 'update_tick_interval')
+        profiler.wrap_inputs(cls, *mouse_handlers)
+        profiler.wrap_counter(cls, 'draw_labels', 'labels', lambda painter, values, xs: len(xs))
+    profiler.wrap_paint(FunctionRuler)
+    profiler.wrap_calls(FunctionRuler, 'draw_arrows')
+    profiler.wrap_inputs(DoubleRulerWidget, *mouse_handlers)
+    profiler.wrap_counter(RulerWidget, 'draw_ticks', 'ticks', lambda painter, values, xs: len(xs))
+    profiler.wrap_counter(RulerWidget, 'draw_tiers', 'ticks', lambda painter, tiers: sum(map(len, tiers)))
+
+
+class RulerState(QObject):
+    # The RulerModel shared by the rulers. Widgets only read it; every mutation
+    # goes through set_values, set_range, set_width or set_exact, which emit `changed`
+    # once and only if something actually changed.
+    #
+    # Several windows may show the same state, the width of the model is the one of the
+    # first. Their rulers show the same range, so a window whose rulers are wider or
+    # narrower reads the model through a copy resized to its width: view_model and
+    # geometry_for are computed once per change and width, and from_view converts what
+    # the rulers of such a window request back to the model.
+
+    changed = pyqtSignal()
+
+    def __init__(self, min_value=0, max_value=100, width=640, exact=False):
+        super().__init__()
+        self.model = RulerModel.from_range(min_value, max_value, width, exact)
+        self.scheduler = FrameScheduler(self)
+        self.pending_values = {}
+        self.view_models = {}
+        self.geometries = {}
+        self.tile_sets = OrderedDict()
+        self.views = []
+
+    def attach(self, view):
+        # A DoubleRulerWidget showing this state, in one of the mirrored windows
+        self.views.append(view)
+
+    def mirrors(self):
+        self.views = [view for view in self.views if not sip.isdeleted(view)]
+        return list(self.views)
+
+    def tiles_for(self, key):
+        # The tiles of the rulers drawn with this key, and whether they were just created
+        tiles = self.tile_sets.get(key)
+        if tiles is not None:
+            self.tile_sets.move_to_end(key)
+            return tiles, False
+        tiles = self.tile_sets[key] = {}
+        if len(self.tile_sets) > TILE_SETS:
+            self.tile_sets.popitem(last=False)
+        return tiles, True
+
+    @property
+    def zero_offset(self):
+        return self.model.zero_offset
+
+    @property
+    def unit_length(self):
+        return self.model.unit_length
+
+    @property
+    def homothetie(self):
+        return self.model.homothetie
+
+    @property
+    def width(self):
+        return self.model.width
+
+    @property
+    def origin(self):
+        return self.model.origin
+
+    @property
+    def exact(self):
+        return self.model.exact
+
+    @property
+    def min_value(self):
+        return self.model.min_value()
+
+    @property
+    def geometry(self):
+        # Shared by all the rulers until the next change
+        return self.geometry_for(self.model.width)
+
+    def view_model(self, width):
+        if width == self.model.width or width <= 2 * PADDING:
+            return self.model
+        model = self.view_models.get(width)
+        if model is None:
+            model = self.view_models[width] = self.model.copy()
+            model.set_width(width)
+        return model
+
+    def geometry_for(self, width):
+        model = self.view_model(width)
+        geometry = self.geometries.get(model.width)
+        if geometry is None:
+            geometry = self.geometries[model.width] = FrameGeometry(model)
+        return geometry
+
+    def from_view(self, width, zero_offset=None, unit_length=None):
+        # Values of the model for pixel values of rulers of this width
+        values = {}
+        ratio = (self.model.width - 2 * PADDING) / (self.view_model(width).width - 2 * PADDING)
+        if zero_offset is not None:
+            values['zero_offset'] = PADDING + (zero_offset - PADDING) * ratio
+        if unit_length is not None:
+            values['unit_length'] = unit_length * ratio
+        return values
+
+    def invalidate(self):
+        self.view_models.clear()
+        self.geometries.clear()
+
+    @property
+    def max_value(self):
+        return self.model.max_value()
+
+    def set_values(self, zero_offset=None, unit_length=None, homothetie=None, origin=None):
+        # zero_offset is the pixel position of origin, the current one when not given
+        model = self.model
+        values = (model.zero_offset if zero_offset is None else zero_offset,
+                  model.unit_length if unit_length is None else unit_length,
+                  model.homothetie if homothetie is None else nonzero_homothetie(homothetie),
+                  model.origin if origin is None else origin)
+        if values == (model.zero_offset, model.unit_length, model.homothetie, model.origin):
+            return
+        model.zero_offset, model.unit_length, model.homothetie, model.origin = values
+        model.recenter(RECENTER_WIDTHS)
+        self.invalidate()
+        self.changed.emit()
+
+    def request_values(self, **values):
+        # Same as set_values, but applied on the next frame: later requests in the
+        # same frame overwrite the earlier ones
+        self.pending_values.update(values)
+        self.scheduler.schedule('values', self.apply_pending_values)
+
+    def apply_pending_values(self):
+        values, self.pending_values = self.pending_values, {}
+        self.set_values(**values)
+
+    def set_range(self, min_value, max_value):
+        model = self.model.copy()
+        model.set_range(min_value, max_value)
+        self.set_values(zero_offset=model.zero_offset, unit_length=model.unit_length, origin=model.origin)
+
+    def set_width(self, width):
+        # Keep the visible range when the rulers are resized
+        if width == self.model.width or width <= 40:
+            return
+        self.model.set_width(width)
+        self.invalidate()
+        self.changed.emit()
+
+    def recenter(self):
+        # Exact mode only: put the origin, around which the rulers zoom, in the middle of the view
+        if self.model.recenter():
+            self.invalidate()
+            self.changed.emit()
+
+    def set_exact(self, exact):
+        # Exact mode keeps the ticks right at any magnitude, see RulerModel
+        if exact == self.model.exact:
+            return
+        self.model.set_exact(exact)
+        self.invalidate()
+        self.changed.emit()
+
+
+def lesson_number(value):
+    # A number of a lesson, given as a JSON number or as a string to keep it exact
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise ValueError(f'{value!r} is not a number')
+    try:
+        number = Fraction(str(value))
+        float(number)
+    except (ValueError, ZeroDivisionError, OverflowError):
+        raise ValueError(f'{value!r} is not a number') from None
+    return number
+
+
+def load_lesson(path):
+    # A JSON list of steps such as {"homothetie": 3}, {"range": [-5, 5]}, {"number": 12}
+    # or {"pause": 1000}, each with an optional "duration" in ms. A step may combine a
+    # range or a number with a homothety. Range bounds and numbers may be strings.
+    with open(path, encoding='utf-8') as f:
+        steps = json.load(f)
+    if not isinstance(steps, list) or not all(isinstance(step, dict) for step in steps):
+        raise ValueError('a lesson is a list of steps')
+    for n, step in enumerate(steps, 1):
+        unknown = set(step) - set(LESSON_STEPS)
+        if unknown:
+            raise ValueError(f'step {n}: unknown key(s) {", ".join(sorted(unknown))}')
+        try:
+            if 'homothetie' in step:
+                homothetie = step['homothetie']
+                if isinstance(homothetie, bool) or not isinstance(homothetie, (int, float)) \
+                        or not math.isfinite(homothetie):
+                    raise ValueError(f'the homothety {homothetie!r} is not a number')
+            if 'range' in step:
+                bounds = step['range']
+                if not isinstance(bounds, list) or len(bounds) != 2:
+                    raise ValueError('a range is a list of two numbers')
+                low, high = map(lesson_number, bounds)
+                if low >= high:
+                    raise ValueError(f'the range {bounds} is empty')
+            if 'number' in step:
+                lesson_number(step['number'])
+            for key in ('pause', 'duration'):
+                if key in step and (isinstance(step[key], bool) or not isinstance(step[key], int) or step[key] < 0):
+                    raise ValueError(f'the {key} {step[key]!r} is not a number of ms')
+        except ValueError as error:
+            raise ValueError(f'step {n}: {error}') from None
+    return steps
+
+
+class RulerAnimator(QObject):
+    # Animated transitions of the shared state towards a homothety, a range or a number,
+    # and lessons chaining them. A single QVariantAnimation drives the progress: each tick
+    # interpolates the model and paints the rulers right away. When a frame takes longer
+    # than the budget, the ticks falling in its overrun are skipped instead of queued.
+    # Any other change of the state, a drag for instance, stops the animation.
+
+    def __init__(self, double_ruler, budget=None):
+        super().__init__(double_ruler)
+        self.double_ruler = double_ruler
+        self.state = double_ruler.main_ruler.state
+        self.budget = (self.state.scheduler.interval if budget is None else budget) / 1000
+        self.animation = QVariantAnimation(self)
+        self.animation.setStartValue(0.0)
+        self.animation.setEndValue(1.0)
+        self.animation.setEasingCurve(QEasingCurve.InOutCubic)
+        self.animation.valueChanged.connect(self.on_progress)
+        self.animation.finished.connect(self.on_finished)
+        self.pause = QTimer(self)
+        self.pause.setSingleShot(True)
+        self.pause.timeout.connect(self.next_step)
+        self.lesson = deque()
+        self.start = None
+        self.target = None
+        self.centers = None
+        self.applied = None
+        self.skip_until = 0
+        self.frames = 0
+        self.skipped_frames = 0
+
+    def animate(self, target, duration=TRANSITION_DURATION):
+        # Move the state to the RulerModel target. The view centre is interpolated linearly
+        # and the unit length geometrically, both from the current origin.
+        model = self.state.model
+        self.animation.stop()
+        self.start = model.copy()
+        self.target = target
+        target_center = (target.width / 2 - target.zero_offset) / target.unit_length
+        self.centers = ((model.width / 2 - model.zero_offset) / model.unit_length,
+                        float(target.origin - model.origin) + target_center)
+        self.applied = model.values()
+        self.skip_until = 0
+        self.animation.setDuration(duration)
+        self.animation.start()
+
+    def animate_homothetie(self, homothetie, duration=TRANSITION_DURATION):
+        self.animate(self.target_for({'homothetie': homothetie}), duration)
+
+    def animate_range(self, min_value, max_value, duration=TRANSITION_DURATION):
+        self.animate(self.target_for({'range': (min_value, max_value)}), duration)
+
+    def center_on(self, number, duration=TRANSITION_DURATION):
+        self.animate(self.target_for({'number': number}), duration)
+
+    def target_for(self, step):
+        target = self.state.model.copy()
+        if 'range' in step:
+            low, high = map(self.number, step['range'])
+            if low < high:
+                target.set_range(low, high)
+        if 'number' in step:
+            # Same zoom, the number in the middle. Beyond the precision of the floats the
+            # view cannot be centred on it and stays where it is.
+            number = self.number(step['number'])
+            half = (target.width / 2 - PADDING) / target.unit_length
+            if target.exact:
+                target.set_range(number - Fraction(half), number + Fraction(half))
+            elif math.isclose((number + half) - (number - half), 2 * half, rel_tol=0.01):
+                target.set_range(number - half, number + half)
+        if 'homothetie' in step:
+            target.homothetie = nonzero_homothetie(step['homothetie'])
+        return target
+
+    def number(self, value):
+        # Numbers of a lesson may be strings, to keep large ones exact
+        return Fraction(str(value)) if self.state.exact else float(value)
+
+    def on_progress(self, progress):
+        model = self.state.model
+        if self.target is None:
+            return
+        if model.values() != self.applied:
+            self.stop()
+            return
+        now = time.perf_counter()
+        if now < self.skip_until:
+            self.skipped_frames += 1
+            return
+
+        start, target = self.start, self.target
+        if start.unit_length * target.unit_length > 0:
+            unit_length = start.unit_length * (target.unit_length / start.unit_length) ** progress
         else:
-            self.zero_offset = zero_offset
-            self.unit_length = unit_length
-            self.min_value = (20 - self.zero_offset) / self.unit_length
-            self.max_value = (self.width() - 20 - self.zero_offset) / self.unit_length
+            unit_length = start.unit_length + (target.unit_length - start.unit_length) * progress
+        center = self.centers[0] + (self.centers[1] - self.centers[0]) * progress
+        # A change of sign steps over 0 towards the target
+        homothetie = nonzero_homothetie(start.homothetie + (target.homothetie - start.homothetie) * progress,
+                                        target.homothetie)
+        self.state.set_values(zero_offset=model.width / 2 - center * unit_length, unit_length=unit_length,
+                              homothetie=homothetie, origin=start.origin)
+        self.double_ruler.repaint()
+        self.applied = model.values()
+        self.frames += 1
+
+        elapsed = time.perf_counter() - now
+        if elapsed > self.budget:
+            self.skip_until = now + 2 * elapsed - self.budget
+
+    def on_finished(self):
+        # The last frame is never skipped and lands exactly on the target
+        target, self.target = self.target, None
+        if target is None:
+            return
+        if self.state.model.values() == self.applied:
+            self.state.set_values(zero_offset=target.zero_offset, unit_length=target.unit_length,
+                                  homothetie=target.homothetie, origin=target.origin)
+        self.next_step()
+
+    def finish(self):
+        # Land at once on the target of the transition and of the rest of the lesson
+        while self.target is not None or self.lesson or self.pause.isActive():
+            if self.target is not None:
+                self.animation.setCurrentTime(self.animation.duration())
+            else:
+                self.pause.stop()
+                self.next_step()
+
+    def stop(self):
+        self.lesson.clear()
+        self.target = None
+        self.animation.stop()
+        self.pause.stop()
+
+    def play(self, steps):
+        self.stop()
+        self.lesson.extend(steps)
+        self.next_step()
+
+    def next_step(self):
+        if not self.lesson:
+            return
+        step = self.lesson.popleft()
+        if 'pause' in step:
+            self.pause.start(step['pause'])
+            return
+        if 'number' in step:
+            self.double_ruler.main_ruler.showSpecialNumber(self.number(step['number']))
+        self.animate(self.target_for(step), step.get('duration', TRANSITION_DURATION))
+
+    def stats(self):
+        return {'frames': self.frames, 'skipped_frames': self.skipped_frames}
+
+
+class RulerWidget(QWidget):
+
+    def __init__(self, min_value=0, max_value=100, tick_length=10, line_thickness=2, state=None):
+        super().__init__()
+        self.state = state if state is not None else RulerState(min_value, max_value)
+        # The rulers of the first window give the model its width, see RulerState
+        self.owns_width = state is None
+        self.state.changed.connect(self.update)
         self.max_integer = min_value
         self.min_integer = max_value
         self.tick_interval = 1
@@ -31,14 +711,51 @@ class RulerWidget(QWidget):
         self.show_ruler = True
         self.show_labels = False
         self.special_number = None
+        self.markers = None
         self.is_dragging = False
         self.start_drag_x = 1
         self.start_drag_unit_length = 1
+        self.tick_layer = TickLayer(self)
+
+    @property
+    def scale(self):
+        # Scale of this ruler relative to the main one
+        return 1
+
+    def view_width(self):
+        # Width of the rulers of this window, the one they read the state at
+        return self.width()
+
+    @property
+    def model(self):
+        return self.state.view_model(self.view_width())
+
+    @property
+    def geometry(self):
+        return self.state.geometry_for(self.view_width())
+
+    @property
+    def zero_offset(self):
+        return self.model.zero_offset
+
+    @property
+    def unit_length(self):
+        return self.model.unit_length * self.scale
+
+    @property
+    def min_value(self):
+        return self.model.min_value(self.scale)
+
+    @property
+    def max_value(self):
+        return self.model.max_value(self.scale)
+
+    def resizeEvent(self, event):
+        if self.owns_width:
+            self.state.set_width(self.width())
 
     def paintEvent(self, event):
-        self.update_zero_offset_system()
         self.update_min_max_integer()
-        self.value_changed.emit()
 
         if not self.show_ruler:
             return
@@ -48,70 +765,109 @@ class RulerWidget(QWidget):
         painter.setRenderHint(QPainter.Antialiasing)
 
         # Draw the horizontal line
-        pen = QPen(Qt.black, self.line_thickness)
-        painter.setPen(pen)
+        painter.setPen(self.tick_pen())
         painter.drawLine(20, self.y_ruler, self.width() - 20, self.y_ruler)  # Horizontal line with padding on both ends
 
-        if self.show_labels:
-            self.update_tick_interval(painter)
-        else:
-            self.tick_interval = 1
-
-        # Draw the vertical ticks
-        for i in range(self.min_integer + ((-self.min_integer) % self.tick_interval),
-                       self.max_integer + 1, self.tick_interval):
-            x = (20 + (self.width() - 40) * (i - self.min_value)
-                 / (self.max_value - self.min_value)) # calculate the x position of the tick
-            painter.drawLine(int(x), self.y_ruler, int(x),
-                             self.y_ruler - self.tick_length)  # Draw the tick (small vertical line)
-
-            # Draw the label above the tick
-            if self.show_labels:
-                label = self.integer_label(i)
-                label_x = int(x) - painter.fontMetrics().width(label) // 2  # Center the label
-                label_y = self.y_ruler - self.tick_length - 10  # Position the label above the tick
-                painter.drawText(label_x, label_y, label)
+        self.set_tick_interval()
+
+        # Draw the vertical ticks and their labels from the cached layer
+        self.tick_layer.paint(painter)
+
+        if self.markers is not None:
+            self.draw_markers(painter)
 
         if self.special_number is not None:
-            if self.min_value <= self.special_number <= self.max_value:
+            if self.model.in_view(self.special_number, self.scale):
                 pen = QPen(Qt.red, self.line_thickness)
                 painter.setPen(pen)
-                x = (20 + (self.width() - 40) * (self.special_number - self.min_value)
-                     / (self.max_value - self.min_value))
+                x = self.model.value_to_pixel(self.special_number, self.scale)
                 painter.drawLine(int(x), self.y_ruler, int(x),
                                  self.y_ruler - self.tick_length)
 
+    def visible_ticks(self):
+        return self.geometry.ticks(self.tick_interval, self.scale)
+
+    def tick_tiers(self):
+        # (step, parent) of the minor tiers shown at this zoom, see rulerModel.tick_tiers
+        return self.model.tick_tiers(self.tick_interval, self.scale)
+
+    def visible_tiers(self):
+        return self.geometry.tiers(self.tick_interval, self.scale)
+
+    def draw_markers(self, painter):
+        # One line per pixel column holding markers, longer when it holds many of them
+        xs, counts = self.markers.columns(self.model, self.scale)
+        painter.setPen(QPen(Qt.darkRed, 1))
+        painter.drawLines([QLineF(x + 0.5, self.y_ruler, x + 0.5,
+                                  max(self.y_ruler - self.tick_length * (1 + math.log10(n)), 0))
+                           for x, n in zip(xs, counts)])
+
+    def cache_key(self):
+        # Everything the rendering of the ticks depends on, besides the widget size and the zero offset
+        return self.unit_length, self.tick_interval, self.show_labels, self.y_ruler, self.font().key()
+
+    def tick_pen(self):
+        return QPen(Qt.black, self.line_thickness)
+
+    def tick_band(self):
+        # Top and bottom of the rows holding the ticks, the labels are outside
+        return self.y_ruler - self.tick_length - self.line_thickness, self.y_ruler + self.line_thickness
+
+    def tick_extent(self, i):
+        # Half width of the tick drawn at i, label included
+        if self.show_labels:
+            return max(self.label(i)[1] // 2, self.line_thickness) + 1
+        return self.line_thickness + 1
+
+    def draw_ticks(self, painter, values, xs):
+        # Draw the vertical ticks in a single call, then their labels. Very dense
+        # rulers are sent in batches so that the QLineF list stays small.
+        painter.setPen(self.tick_pen())
+        for start in range(0, len(xs), LINES_PER_CALL):
+            painter.drawLines(self.tick_lines(xs[start:start + LINES_PER_CALL]))
+        if self.show_labels:
+            self.draw_labels(painter, values, xs)
+
+    def tick_lines(self, xs):
+        # One small vertical line per tick
+        y_top = self.y_ruler - self.tick_length
+        return [QLineF(x, self.y_ruler, x, y_top) for x in xs]
+
+    def draw_tiers(self, painter, tiers):
+        # Minor ticks, thinner and shorter at each tier. Their ticks are kept
+        # MIN_TICK_SPACING pixels apart, so a tier never outnumbers the pixel columns.
+        painter.setPen(QPen(self.tick_pen().color(), 1))
+        for xs, length in zip(tiers, TIER_LENGTHS):
+            painter.drawLines(self.tier_lines(xs, round(self.tick_length * length)))
+
+    def tier_lines(self, xs, length):
+        y_top = self.y_ruler - length
+        return [QLineF(x, self.y_ruler, x, y_top) for x in xs]
+
+    def draw_labels(self, painter, values, xs):
+        label_y = self.y_ruler - self.tick_length - 10  # Position the labels above the ticks
+        for i, x in zip(values, xs):
+            label, width = self.label(i)
+            painter.drawText(x - width // 2, label_y, label)  # Center the label
+
     def update_min_max_integer(self):
-        if self.min_value < self.max_value:
-            if self.min_value <= 0:
-                self.min_integer = int(self.min_value)
-            else:
-                self.min_integer = int(self.min_value) + 1
-            if self.max_value <= 0:
-                self.max_integer = int(self.max_value) - 1
-            else:
-                self.max_integer = int(self.max_value)
-        else:
-            if self.min_value <= 0:
-                self.min_integer = int(self.min_value) - 1
-            else:
-                self.min_integer = int(self.min_value)
-            if self.max_value <= 0:
-                self.max_integer = int(self.max_value) - 2
-            else:
-                self.max_integer = int(self.max_value) - 1
+        self.min_integer, self.max_integer = self.geometry.integer_range(self.scale)
 
     def print(self):
         print('Properties of the ruler :')
         print(f'Zero offset: {self.zero_offset}')
+        print(f'Origin: {self.state.origin}')
         print(f'Unit length: {self.unit_length}')
         print(f'Min value: {self.min_value}')
         print(f'Max value: {self.max_value}')
+        print(f'Label cache: {label_cache.info()}')
+        print(f'Frames: {self.state.scheduler.stats()}')
 
     def mousePressEvent(self, event):
         # Catch right-click events in the RulerWidget
         if event.button() == Qt.RightButton:
             if event.type() == QEvent.MouseButtonPress:
+                self.state.recenter()
                 if abs(event.x() - self.zero_offset) > 30:
                     # Start dragging
                     self.is_dragging = True
@@ -127,11 +883,9 @@ class RulerWidget(QWidget):
                 # Calculate the difference in X position during dragging
                 delta_x = (event.x() - self.zero_offset) / self.start_drag_x
 
-                # Update the zero_offset based on mouse movement
-                self.unit_length = self.start_drag_unit_length * delta_x
-                self.update_min_max_system()
-                # Trigger a repaint to update the ruler display
-                self.update()
+                # Update the unit length based on mouse movement, applied on the next frame
+                unit_length = self.start_drag_unit_length * delta_x
+                self.state.request_values(**self.state.from_view(self.view_width(), unit_length=unit_length))
         else:
             super().mouseMoveEvent(event)
 
@@ -139,71 +893,128 @@ class RulerWidget(QWidget):
         # Catch right-click events in the RulerWidget
         if event.button() == Qt.RightButton:
             if event.type() == QEvent.MouseButtonRelease:
-                # Stop dragging
+                # Stop dragging, the last position is applied right away
                 self.is_dragging = False
+                self.state.scheduler.flush()
         # If left-clicked, ignore so it can propagate to DoubleRulerWidget
         else:
             super().mouseReleaseEvent(event)
 
-    def update_zero_offset_system(self):
-        self.unit_length = (self.width() - 40) / (self.max_value - self.min_value)
-        self.zero_offset = 20 - self.min_value * self.unit_length
+    def set_tick_interval(self):
+        # Labelled ticks are spaced for their widest label, bare ones closer
+        if self.show_labels:
+            self.update_tick_interval()
+        else:
+            self.tick_interval = self.geometry.tick_interval(UNLABELLED_WIDTH, self.scale)
 
-    def update_min_max_system(self):
-        self.min_value = (20 - self.zero_offset) / self.unit_length
-        self.max_value = (self.width() - 20 - self.zero_offset) / self.unit_length
+    def update_tick_interval(self):
+        self.tick_interval = self.compute_tick_interval()
 
-    def update_tick_interval(self, painter):
-        interval_marker = False
-        if self.min_value <= self.max_value:
-            self.tick_interval = 1
-        else:
-            self.tick_interval = -1
-        while not interval_marker:
-            interval_marker = True
-            nb_graduations = (self.max_integer - self.min_integer) // self.tick_interval + 1
-            place_per_graduation = self.width() // nb_graduations - 5
-            for i in range(self.min_integer + ((-self.min_integer) % self.tick_interval),
-                           self.max_integer + 1, self.tick_interval):
-                if painter.fontMetrics().width(str(i)) > place_per_graduation:
-                    interval_marker = False
-            if not interval_marker:
-                if self.tick_interval == 1 or self.tick_interval == -1 or self.tick_interval % 10 == 0:
-                    self.tick_interval *= 5
-                else:
-                    self.tick_interval *= 2
+    def compute_tick_interval(self, homothetie=None):
+        # The widest label is always found at one of the ends of the visible range
+        label_width = max(self.label(self.min_integer, homothetie)[1],
+                          self.label(self.max_integer, homothetie)[1])
+        return self.geometry.tick_interval(label_width, self.scale)
 
     def showSpecialNumber(self, number):
-        self.special_number = float(number)
+        # Exact rulers keep the number as given, a Fraction for instance
+        self.special_number = number if self.state.exact else float(number)
         self.update()
 
     def onEraseSpecialNumber(self):
         self.special_number = None
         self.update()
 
-    def integer_label(self, i):
-        if i > 0:
-            return '+' + str(i)
-        else:
-            return str(i)
+    def showMarkers(self, markers):
+        self.markers = markers
+        self.update()
+
+    def onEraseMarkers(self):
+        self.markers = None
+        self.update()
 
-class BottomRuler(RulerWidget):
+    def label(self, i, homothetie=None):
+        # Text and width of the label of i, from the shared cache
+        return label_cache.get(i, homothetie, self.font())
 
-    value_changed = pyqtSignal()
+    def integer_label(self, i):
+        return integer_label(i)
+
+class LowerRuler(RulerWidget):
+    # A ruler under the main one, on its state and at its width, with its line at the
+    # top of the ticks: they and their labels hang below it
 
     def __init__(self, main_ruler, *args, **kwargs):
-        super().__init__(*args, **kwargs)
+        super().__init__(*args, state=main_ruler.state, **kwargs)
         self.main_ruler = main_ruler
-        self.homothetie = 1
+
+    def view_width(self):
+        return self.main_ruler.width()
+
+    def resizeEvent(self, event):
+        # The main ruler owns the shared width
+        pass
+
+    def tick_band(self):
+        return self.y_ruler - self.line_thickness, self.y_ruler + self.tick_length + self.line_thickness
+
+    def tier_lines(self, xs, length):
+        y_end = self.y_ruler + length
+        return [QLineF(x, self.y_ruler, x, y_end) for x in xs]
+
+    def draw_labels(self, painter, values, xs):
+        label_y = self.y_ruler + self.tick_length + 10 + self.fontMetrics().height() // 2  # Below the ticks
+        for i, x in zip(values, xs):
+            label, width = self.label(i)
+            painter.drawText(x - width // 2, label_y, label)
+
+
+class BottomRuler(LowerRuler):
+
+    def __init__(self, main_ruler, *args, homothetie=None, **kwargs):
+        super().__init__(main_ruler, *args, **kwargs)
+        # The first ruler follows the homothety of the shared state, the ones added
+        # to the stack afterwards keep their own
+        self.own_homothetie = homothetie
 
         self.setMinimumHeight(70)
-        self.copy_parent()
-        self.main_ruler.value_changed.connect(self.update)
+
+    @property
+    def homothetie(self):
+        if self.own_homothetie is None:
+            return self.state.homothetie
+        return self.own_homothetie
+
+    def request_homothetie(self, homothetie):
+        if self.own_homothetie is None:
+            self.state.request_values(homothetie=homothetie)
+        else:
+            self.state.scheduler.schedule(self, lambda: self.set_mirrored_homothetie(homothetie))
+
+    def set_mirrored_homothetie(self, homothetie):
+        # Set it on this added ruler and on the ones at the same place of the stack in
+        # the other windows of the state, which add and remove their rulers together
+        views = self.state.mirrors()
+        index = next((view.homothety_rulers.index(self) for view in views if self in view.homothety_rulers), None)
+        if index is None:
+            self.set_own_homothetie(homothetie)
+            return
+        for view in views:
+            if index < len(view.homothety_rulers):
+                view.homothety_rulers[index].set_own_homothetie(homothetie)
+
+    def set_own_homothetie(self, homothetie):
+        homothetie = nonzero_homothetie(homothetie)
+        if homothetie != self.own_homothetie:
+            self.own_homothetie = homothetie
+            self.update()
+
+    @property
+    def scale(self):
+        return self.homothetie
 
     def paintEvent(self, event):
-        self.copy_parent()
         self.update_min_max_integer()
-        self.value_changed.emit()
         if not self.show_ruler:
             return
         self.y_ruler = 0
@@ -211,87 +1022,55 @@ class BottomRuler(RulerWidget):
         painter = QPainter(self)
         painter.setRenderHint(QPainter.Antialiasing)
 
-        # Draw the horizontal line
-        pen = QPen(Qt.darkBlue, self.line_thickness)
-        painter.setPen(pen)
+        self.set_tick_interval()
 
-        if self.show_labels:
-            self.update_tick_interval(painter)
-        else:
-            self.tick_interval = 1
-
-        # Draw the vertical ticks
-        for i in range(self.min_integer + ((-self.min_integer) % self.tick_interval),
-                       self.max_integer + 1, self.tick_interval):
-            x = (20 + (self.width() - 40) * (i - self.min_value)
-                 / (self.max_value - self.min_value)) # calculate the x position of the tick
-
-            painter.drawLine(int(x), self.y_ruler, int(x),
-                             self.y_ruler + self.tick_length)  # Draw the tick (small vertical line)
-            painter.drawLine(int(x), self.y_ruler, int(x) - self.tick_length // 3,
-                             self.y_ruler + self.tick_length // 3)
-            painter.drawLine(int(x), self.y_ruler, int(x) + self.tick_length // 3,
-                             self.y_ruler + self.tick_length // 3)
-
-            if self.show_labels:
-                if abs(self.homothetie - round(self.homothetie)) < 0.02:
-                    label_product = self.prod_label(i)
-                    label_x = int(x) - painter.fontMetrics().width(label_product) // 2  # Center the label
-                    label_y = self.y_ruler + self.tick_length + 10 + painter.fontMetrics().height() // 2  # Position the label above the tick
-                    painter.drawText(label_x, label_y, label_product)
-
-                    label = self.integer_label(i)
-                    label_x = int(x) - painter.fontMetrics().width(label) // 2  # Center the label
-                    label_y = self.y_ruler + self.tick_length + 20 + 3 * painter.fontMetrics().height() // 2  # Position the label above the tick
-                    painter.drawText(label_x, label_y, label)
-
-                else:
-                    label = self.integer_label(i)
-                    label_x = int(x) - painter.fontMetrics().width(label) // 2  # Center the label
-                    label_y = self.y_ruler + self.tick_length + 10 + painter.fontMetrics().height() // 2  # Position the label above the tick
-                    painter.drawText(label_x, label_y, label)
-
-    def copy_parent(self):
-        self.zero_offset = self.main_ruler.zero_offset
-        self.unit_length = self.main_ruler.unit_length * self.homothetie
-        self.update_min_max_system()
-
-    def update_tick_interval(self, painter):
-        interval_marker = False
-        if self.min_value <= self.max_value:
-            self.tick_interval = 1
-        else:
-            self.tick_interval = -1
+        # Draw the arrows and their labels from the cached layer
+        self.tick_layer.paint(painter)
 
-        if abs(self.homothetie - round(self.homothetie)) >= 0.02:
-            while not interval_marker:
-                interval_marker = True
-                nb_graduations = (self.max_integer - self.min_integer) // self.tick_interval + 1
-                place_per_graduation = self.width() // nb_graduations - 5
-                for i in range(self.min_integer + ((-self.min_integer) % self.tick_interval),
-                               self.max_integer + 1, self.tick_interval):
-                    if painter.fontMetrics().width(str(i)) > place_per_graduation:
-                        interval_marker = False
-                if not interval_marker:
-                    if self.tick_interval == 1 or self.tick_interval == -1 or self.tick_interval % 10 == 0:
-                        self.tick_interval *= 5
-                    else:
-                        self.tick_interval *= 2
+    def cache_key(self):
+        return super().cache_key() + (self.homothetie,)
 
+    def tick_pen(self):
+        return QPen(Qt.darkBlue, self.line_thickness)
+
+    def tick_extent(self, i):
+        extent = self.tick_length // 3 + self.line_thickness
+        if self.show_labels:
+            extent = max(extent, self.label(i)[1] // 2, self.label(i, self.homothetie)[1] // 2)
+        return extent + 1
+
+    def tick_lines(self, xs):
+        # Each arrow is its shaft and the two strokes of its head, the minor tiers keep
+        # the plain strokes of LowerRuler.tier_lines
+        y_head = self.y_ruler + self.tick_length // 3
+        y_end = self.y_ruler + self.tick_length
+        head = self.tick_length // 3
+        lines = []
+        for x in xs:
+            lines += (QLineF(x, self.y_ruler, x, y_end),
+                      QLineF(x, self.y_ruler, x - head, y_head),
+                      QLineF(x, self.y_ruler, x + head, y_head))
+        return lines
+
+    def draw_labels(self, painter, values, xs):
+        if abs(self.homothetie - round(self.homothetie)) >= 0.02:
+            super().draw_labels(painter, values, xs)
+            return
+        # The product goes first, the integer on a second line
+        height = self.fontMetrics().height()
+        label_y = self.y_ruler + self.tick_length + 10 + height // 2  # Position the labels below the arrows
+        second_y = self.y_ruler + self.tick_length + 20 + 3 * height // 2
+        for i, x in zip(values, xs):
+            label_product, width = self.label(i, self.homothetie)
+            painter.drawText(x - width // 2, label_y, label_product)
+            label, width = self.label(i)
+            painter.drawText(x - width // 2, second_y, label)
+
+    def update_tick_interval(self):
+        if abs(self.homothetie - round(self.homothetie)) >= 0.02:
+            self.tick_interval = self.compute_tick_interval()
         else:
-            while not interval_marker:
-                interval_marker = True
-                nb_graduations = (self.max_integer - self.min_integer) // self.tick_interval + 1
-                place_per_graduation = self.width() // nb_graduations - 5
-                for i in range(self.min_integer + ((-self.min_integer) % self.tick_interval),
-                               self.max_integer + 1, self.tick_interval):
-                    if painter.fontMetrics().width(self.prod_label(i)) > place_per_graduation:
-                        interval_marker = False
-                if not interval_marker:
-                    if self.tick_interval == 1 or self.tick_interval == -1 or self.tick_interval % 10 == 0:
-                        self.tick_interval *= 5
-                    else:
-                        self.tick_interval *= 2
+            self.tick_interval = self.compute_tick_interval(self.homothetie)
 
     def mousePressEvent(self, event):
         # Catch right-click events in the RulerWidget
@@ -312,14 +1091,11 @@ class BottomRuler(RulerWidget):
                 # Calculate the difference in X position during dragging
                 delta_x = (event.x() - self.zero_offset) / self.start_drag_x
 
-                # Update the zero_offset based on mouse movement
-                self.homothetie = delta_x * self.start_drag_unit_length
-                if round(self.homothetie) != 0 and 0.97 < (self.homothetie / round(self.homothetie)) < 1.03:
-                    self.homothetie = round(self.homothetie)
-                self.unit_length = self.main_ruler.unit_length * self.homothetie
-                self.update_min_max_system()
-                # Trigger a repaint to update the ruler display
-                self.update()
+                # Update the homothetie based on mouse movement
+                homothetie = delta_x * self.start_drag_unit_length
+                if round(homothetie) != 0 and 0.97 < (homothetie / round(homothetie)) < 1.03:
+                    homothetie = round(homothetie)
+                self.request_homothetie(homothetie)
         else:
             super().mouseMoveEvent(event)
 
@@ -327,43 +1103,144 @@ class BottomRuler(RulerWidget):
         # Catch right-click events in the RulerWidget
         if event.button() == Qt.RightButton:
             if event.type() == QEvent.MouseButtonRelease:
-                # Stop dragging
+                # Stop dragging, the last position is applied right away
                 self.is_dragging = False
+                self.state.scheduler.flush()
         # If left-clicked, ignore so it can propagate to DoubleRulerWidget
         else:
             super().mouseReleaseEvent(event)
 
     def prod_label(self, i):
-        if i > 0:
-            return f'(+{i})x{self.homothetie:.0f}'
-        if i == 0:
-            return f'{i}x{self.homothetie:.0f}'
-        else:
-            return f'({i})x{self.homothetie:.0f}'
+        return prod_label(i, self.homothetie)
+
+
+class FunctionRuler(LowerRuler):
+    # A second ruler under the main one, with an arrow from each tick of the main ruler
+    # to the image of its value by a functionMap.FunctionMap. The images come from the
+    # chunks cached by the function, which are computed once per expression and range.
+    # The arrows land on the line from above, so its ticks and labels are below it.
+
+    def __init__(self, main_ruler, function, *args, **kwargs):
+        super().__init__(main_ruler, *args, **kwargs)
+        self.function = function
+        self.setMinimumHeight(120)
+
+    def set_function(self, function):
+        self.function = function
+        self.update()
+
+    def paintEvent(self, event):
+        self.update_min_max_integer()
+        if not self.show_ruler:
+            return
+        metrics = self.fontMetrics()
+        self.y_ruler = self.rect().height() - self.tick_length - 10 - metrics.height() // 2 - metrics.descent()
+
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.Antialiasing)
+        self.draw_arrows(painter)
+
+        painter.setPen(self.tick_pen())
+        painter.drawLine(20, self.y_ruler, self.width() - 20, self.y_ruler)
+        self.set_tick_interval()
+        self.tick_layer.paint(painter)
+
+    def draw_arrows(self, painter):
+        # From the ticks of the main ruler, just above, down to their images. An image
+        # beyond the ends of the ruler only gets a short grey line towards its end: long
+        # antialiased lines are what a frame would spend its time on.
+        values, xs = self.main_ruler.visible_ticks()
+        image_xs, inside = self.function.arrows(self.model, values)
+        head = self.tick_length * 0.7
+        stub = self.tick_length * 2
+        arrows, outside = [], []
+        for x, image_x, visible in zip(xs, image_xs, inside):
+            if image_x != image_x:
+                continue  # Not defined
+            angle = math.atan2(self.y_ruler, image_x - x)
+            if not visible:
+                outside.append(QLineF(x, 0, x + stub * math.cos(angle), stub * math.sin(angle)))
+                continue
+            arrows += (QLineF(x, 0, image_x, self.y_ruler),
+                       QLineF(image_x, self.y_ruler, image_x - head * math.cos(angle - 0.4),
+                              self.y_ruler - head * math.sin(angle - 0.4)),
+                       QLineF(image_x, self.y_ruler, image_x - head * math.cos(angle + 0.4),
+                              self.y_ruler - head * math.sin(angle + 0.4)))
+        painter.setPen(QPen(Qt.lightGray, 1))
+        painter.drawLines(outside)
+        painter.setPen(QPen(Qt.darkGreen, 1))
+        painter.drawLines(arrows)
+
+    def tick_pen(self):
+        return QPen(Qt.darkGreen, self.line_thickness)
+
+    def tick_lines(self, xs):
+        return self.tier_lines(xs, self.tick_length)
 
 
 class DoubleRulerWidget(QWidget):
-    def __init__(self):
+    def __init__(self, state=None):
         super().__init__()
+        self.state = state
         self.main_ruler = None
         self.low_ruler = None
+        self.function_ruler = None
+        self.homothety_rulers = []
         self.start_drag_x = None
         self.is_dragging = None
         self.start_drag_zero_offset = None
+        self.start_drag_origin = 0
         self.show_labels = False
         self.initUI()
 
     def initUI(self):
-        self.main_ruler = RulerWidget(min_value=-10, max_value=10)
+        self.main_ruler = RulerWidget(min_value=-10, max_value=10, state=self.state)
+        self.state = self.main_ruler.state
+        self.state.attach(self)
         self.low_ruler = BottomRuler(main_ruler=self.main_ruler, tick_length=20)
         self.low_ruler.show_ruler = False
 
+        self.homothety_rulers = [self.low_ruler]
+        self.animator = RulerAnimator(self)
+
         layout = QVBoxLayout()
         layout.addWidget(self.main_ruler)
         layout.addWidget(self.low_ruler)
 
         self.setLayout(layout)
 
+    def add_homothety_ruler(self, homothetie):
+        ruler = BottomRuler(main_ruler=self.main_ruler, tick_length=20, homothetie=nonzero_homothetie(homothetie))
+        ruler.show_labels = self.show_labels
+        self.low_ruler.show_ruler = ruler.show_ruler = True
+        self.homothety_rulers.append(ruler)
+        self.layout().addWidget(ruler)
+        return ruler
+
+    def set_function(self, function):
+        # Draw the arrows of function between the main ruler and a second one, None removes them
+        if function is None:
+            if self.function_ruler is not None:
+                self.layout().removeWidget(self.function_ruler)
+                self.function_ruler.deleteLater()
+                self.function_ruler = None
+        elif self.function_ruler is None:
+            self.function_ruler = FunctionRuler(self.main_ruler, function)
+            self.function_ruler.show_labels = self.show_labels
+            self.layout().insertWidget(1, self.function_ruler)
+        else:
+            self.function_ruler.set_function(function)
+
+    def remove_homothety_ruler(self, ruler=None):
+        # The first homothety ruler is the one of the shared state and always stays
+        if ruler is None:
+            ruler = self.homothety_rulers[-1]
+        if ruler is self.low_ruler or ruler not in self.homothety_rulers:
+            return
+        self.homothety_rulers.remove(ruler)
+        self.layout().removeWidget(ruler)
+        ruler.deleteLater()
+
     def mousePressEvent(self, event):
         if event.type() == QEvent.MouseButtonPress:
             if event.button() == Qt.LeftButton:
@@ -371,63 +1248,96 @@ class DoubleRulerWidget(QWidget):
                 self.is_dragging = True
                 self.start_drag_x = event.x()  # Record the X position where dragging starts
                 self.start_drag_zero_offset = self.main_ruler.zero_offset
+                self.start_drag_origin = self.main_ruler.state.origin
 
     def mouseMoveEvent(self, event):
         if self.is_dragging:
             # Calculate the difference in X position during dragging
             delta_x = event.x() - self.start_drag_x
 
-            # Update the zero_offset based on mouse movement
-            self.main_ruler.zero_offset = self.start_drag_zero_offset + delta_x
-            self.main_ruler.update_min_max_system()
-            self.low_ruler.zero_offset = self.main_ruler.zero_offset
-            self.low_ruler.update_min_max_system()
-            # Trigger a repaint to update the ruler display
-            self.update()
+            # Update the zero_offset based on mouse movement, applied on the next frame.
+            # It is the position of the origin at the start, which exact mode may have moved.
+            zero_offset = self.start_drag_zero_offset + delta_x
+            self.state.request_values(**self.state.from_view(self.main_ruler.width(), zero_offset=zero_offset),
+                                      origin=self.start_drag_origin)
 
     def mouseReleaseEvent(self, event):
         if event.type() == QEvent.MouseButtonRelease:
             if event.button() == Qt.LeftButton:
-                # Stop dragging
+                # Stop dragging, the last position is applied right away
                 self.is_dragging = False
+                self.main_ruler.state.scheduler.flush()
+
+    def mirrors(self):
+        # The DoubleRulerWidgets of all the windows showing the same state, this one included
+        return self.state.mirrors()
+
+    def copy_view(self, other):
+        # Show what another view of the same state shows
+        for ruler in other.homothety_rulers[1:]:
+            self.add_homothety_ruler(ruler.own_homothetie)
+        self.set_show_labels(other.show_labels)
+        self.set_show_ruler(other.low_ruler.show_ruler)
+        self.set_function(other.function_ruler.function if other.function_ruler is not None else None)
+        self.main_ruler.special_number = other.main_ruler.special_number
+        self.main_ruler.markers = other.main_ruler.markers
 
     def onShowRulerButton(self):
-        if self.low_ruler.show_ruler:
-            self.low_ruler.show_ruler = False
-        else:
-            self.low_ruler.show_ruler = True
+        show_ruler = not self.low_ruler.show_ruler
+        for view in self.mirrors():
+            view.set_show_ruler(show_ruler)
+
+    def set_show_ruler(self, show_ruler):
+        for ruler in self.homothety_rulers:
+            ruler.show_ruler = show_ruler
         self.update()
 
     def onShowIntegerButton(self):
-        if self.show_labels:
-            self.main_ruler.show_labels = False
-            self.low_ruler.show_labels = False
-            self.show_labels = False
-        else:
-            self.main_ruler.show_labels = True
-            self.low_ruler.show_labels = True
-            self.show_labels = True
+        show_labels = not self.show_labels
+        for view in self.mirrors():
+            view.set_show_labels(show_labels)
+
+    def set_show_labels(self, show_labels):
+        self.show_labels = show_labels
+        self.main_ruler.show_labels = show_labels
+        for ruler in self.homothety_rulers:
+            ruler.show_labels = show_labels
+        if self.function_ruler is not None:
+            self.function_ruler.show_labels = show_labels
         self.update()
 
     def set_homothetie(self, homothetie):
-        self.low_ruler.homothetie = homothetie
-        self.low_ruler.update_min_max_system()
-        self.update()
+        self.main_ruler.state.set_values(homothetie=homothetie)
+
+    def onExactButton(self):
+        state = self.main_ruler.state
+        state.set_exact(not state.exact)
 
 
 class RulerWindow(QWidget):
-    def __init__(self):
+    # A window on a new RulerState, or on the state of another window: the two then
+    # mirror each other, see on_mirror_open
+    def __init__(self, state=None):
         super().__init__()
+        self.state = state
         self.homothetie_current_label = None
         self.doubleRuler = None
+        self.exact_button = None
+        self.mirror_windows = []
         self.special_number_input = None
+        self.multiples_input = None
+        self.function_input = None
         self.homothetie_input = None
+        self.deferred_pending = True
         self.initUI()
 
     def initUI(self):
+        # The whole window is built before it is shown, only NumPy is loaded after the
+        # first frame, see initDeferred
         layout = QVBoxLayout()
 
-        self.doubleRuler = DoubleRulerWidget()
+        self.doubleRuler = DoubleRulerWidget(self.state)
+        self.state = self.doubleRuler.state
 
         show_integer_layout = QHBoxLayout()
         show_integer_button_up = QPushButton('Montrer graduation', self)
@@ -436,7 +1346,36 @@ class RulerWindow(QWidget):
         show_integer_button_down.clicked.connect(self.doubleRuler.onShowRulerButton)
         show_integer_layout.addWidget(show_integer_button_up)
         show_integer_layout.addWidget(show_integer_button_down)
+        # With the display toggles: on the row of the special number it widened the window past 1024 pixels
+        exact_button = self.exact_button = QPushButton('Précision exacte', self)
+        exact_button.setCheckable(True)
+        exact_button.setChecked(self.state.exact)
+        exact_button.clicked.connect(self.doubleRuler.onExactButton)
+        show_integer_layout.addWidget(exact_button)
+
+        layout.addLayout(show_integer_layout)
+        layout.addWidget(self.doubleRuler)
+        self.initControls(layout)
+
+        # Set the layout and window properties
+        self.setLayout(layout)
+        self.setWindowTitle('Z dans tous ses états')
+        self.setGeometry(300, 300, 500, 300)
+
+    def paintEvent(self, event):
+        if self.deferred_pending:
+            # The first frame is being painted, load what it did not need after it
+            QTimer.singleShot(0, self.initDeferred)
+
+    def initDeferred(self):
+        # NumPy takes about as long to import as PyQt5, the rulers use it once it is there
+        if not self.deferred_pending:
+            return
+        load_numpy()
+        self.deferred_pending = False
 
+    def initControls(self, layout):
+        # The rows below the rulers
         special_number_layout = QHBoxLayout()
         special_number_label = QLabel("Entrer un nombre à faire apparaître sur l'échelle: ", self)
         self.special_number_input = QLineEdit()
@@ -444,12 +1383,47 @@ class RulerWindow(QWidget):
         special_number_show = QPushButton("Montrer l'emplacement du nombre", self)
         special_number_show.clicked.connect(self.on_input_object)
         special_number_erase = QPushButton('Effacer', self)
-        special_number_erase.clicked.connect(self.doubleRuler.main_ruler.onEraseSpecialNumber)
+        special_number_erase.clicked.connect(self.on_special_number_erase)
         special_number_layout.addWidget(special_number_label)
         special_number_layout.addWidget(self.special_number_input)
         special_number_layout.addWidget(special_number_show)
         special_number_layout.addWidget(special_number_erase)
 
+        markers_layout = QHBoxLayout()
+        markers_label = QLabel('Mettre en évidence les multiples de: ', self)
+        self.multiples_input = QLineEdit()
+        self.multiples_input.setValidator(QIntValidator())
+        multiples_show = QPushButton('Montrer les multiples', self)
+        multiples_show.clicked.connect(self.on_multiples_show)
+        primes_show = QPushButton('Montrer les nombres premiers', self)
+        primes_show.clicked.connect(self.on_primes_show)
+        markers_load = QPushButton('Charger un fichier CSV', self)
+        markers_load.clicked.connect(self.on_markers_load)
+        markers_erase = QPushButton('Effacer', self)
+        markers_erase.clicked.connect(self.on_markers_erase)
+        markers_layout.addWidget(markers_label)
+        markers_layout.addWidget(self.multiples_input)
+        markers_layout.addWidget(markers_erase)
+        # The generators on a row of their own, the window still fits a 1024 pixel screen
+        markers_generators_layout = QHBoxLayout()
+        markers_generators_layout.addWidget(multiples_show)
+        markers_generators_layout.addWidget(primes_show)
+        markers_generators_layout.addWidget(markers_load)
+
+        function_layout = QHBoxLayout()
+        function_label = QLabel('Entrer une fonction f(n): ', self)
+        self.function_input = QLineEdit()
+        self.function_input.setPlaceholderText('n + 3, n², n mod 5, −n, n // 2 si n % 2 == 0 sinon 3n + 1')
+        self.function_input.returnPressed.connect(self.on_function_show)
+        function_show = QPushButton('Tracer les flèches n → f(n)', self)
+        function_show.clicked.connect(self.on_function_show)
+        function_erase = QPushButton('Effacer', self)
+        function_erase.clicked.connect(self.on_function_erase)
+        function_layout.addWidget(function_label)
+        function_layout.addWidget(self.function_input)
+        function_layout.addWidget(function_show)
+        function_layout.addWidget(function_erase)
+
         homothetie_layout = QHBoxLayout()
         self.homothetie_current_label = QLabel('Homothétie actuelle: 1', self)
         homothetie_label = QLabel('Entrer manuellement une homothétie: ', self)
@@ -462,39 +1436,174 @@ class RulerWindow(QWidget):
         homothetie_layout.addWidget(self.homothetie_input)
         homothetie_layout.addWidget(homothetie_set)
 
-        self.doubleRuler.main_ruler.value_changed.connect(self.on_ruler_value_changed)
-        self.doubleRuler.low_ruler.value_changed.connect(self.on_ruler_value_changed)
+        stack_layout = QHBoxLayout()
+        stack_add = QPushButton("Ajouter une règle avec cette homothétie", self)
+        stack_add.clicked.connect(self.on_homothety_ruler_add)
+        stack_remove = QPushButton('Retirer la dernière règle', self)
+        stack_remove.clicked.connect(self.on_homothety_ruler_remove)
+        mirror_open = QPushButton('Ouvrir une copie de la fenêtre', self)
+        mirror_open.clicked.connect(self.on_mirror_open)
+        stack_layout.addWidget(stack_add)
+        stack_layout.addWidget(stack_remove)
+        stack_layout.addWidget(mirror_open)
+
+        self.state.changed.connect(self.on_ruler_value_changed)
 
-        layout.addLayout(show_integer_layout)
-        layout.addWidget(self.doubleRuler)
         layout.addLayout(special_number_layout)
+        layout.addLayout(markers_layout)
+        layout.addLayout(markers_generators_layout)
+        layout.addLayout(function_layout)
         layout.addLayout(homothetie_layout)
+        layout.addLayout(stack_layout)
 
-        # Set the layout and window properties
-        self.setLayout(layout)
-        self.setWindowTitle('Z dans tous ses états')
-        self.setGeometry(300, 300, 500, 300)
+    def main_rulers(self):
+        # The main rulers of this window and of the windows mirroring it
+        return [view.main_ruler for view in self.doubleRuler.mirrors()]
 
     def on_input_object(self):
         special_number = self.special_number_input.text()
+        main_ruler = self.doubleRuler.main_ruler
+        try:
+            if self.state.exact:
+                number = Fraction(special_number.replace(',', '.'))
+            else:
+                number = float(special_number)
+        except ValueError:
+            self.on_special_number_erase()
+            return
+        for ruler in self.main_rulers():
+            ruler.showSpecialNumber(number)
+        # Bring the number into view when it is outside
+        if not main_ruler.model.in_view(main_ruler.special_number):
+            self.doubleRuler.animator.center_on(main_ruler.special_number)
+
+    def on_multiples_show(self):
+        from markerIndex import MarkerIndex
+
+        multiple = self.multiples_input.text()
         try:
-            self.doubleRuler.main_ruler.showSpecialNumber(float(special_number))
+            self.show_markers(MarkerIndex.multiples(int(multiple)))
         except ValueError:
-            self.doubleRuler.main_ruler.showSpecialNumber(None)
+            print(f'The value {multiple} is not acceptable')
+
+    def on_primes_show(self):
+        from markerIndex import MarkerIndex
+
+        self.show_markers(MarkerIndex.primes())
+
+    def on_markers_load(self):
+        path, _ = QFileDialog.getOpenFileName(self, 'Charger des nombres', '', 'CSV (*.csv);;Tous les fichiers (*)')
+        if not path:
+            return
+        from markerIndex import MarkerIndex
+
+        try:
+            self.show_markers(MarkerIndex.from_csv(path))
+        except (OSError, UnicodeDecodeError) as error:
+            print(f'The file {path} could not be read: {error}')
+
+    def show_markers(self, markers):
+        for ruler in self.main_rulers():
+            ruler.showMarkers(markers)
+
+    def on_markers_erase(self):
+        for ruler in self.main_rulers():
+            ruler.onEraseMarkers()
+
+    def on_special_number_erase(self):
+        for ruler in self.main_rulers():
+            ruler.onEraseSpecialNumber()
+
+    def on_function_show(self):
+        from functionMap import function_map
+
+        text = self.function_input.text()
+        try:
+            function = function_map(text)
+        except ValueError as error:
+            print(f'The function {text} is not acceptable: {error}')
+            return
+        for view in self.doubleRuler.mirrors():
+            view.set_function(function)
+
+    def on_function_erase(self):
+        for view in self.doubleRuler.mirrors():
+            view.set_function(None)
 
     def on_homothetie_set(self):
         homothetie = self.homothetie_input.text()
         try:
-            self.doubleRuler.set_homothetie(float(homothetie))
+            self.doubleRuler.animator.animate_homothetie(float(homothetie))
+        except ValueError:
+            print(f'The value {homothetie} is not acceptable')
+
+    def on_homothety_ruler_add(self):
+        homothetie = self.homothetie_input.text()
+        try:
+            homothetie = float(homothetie)
         except ValueError:
             print(f'The value {homothetie} is not acceptable')
+            return
+        for view in self.doubleRuler.mirrors():
+            view.add_homothety_ruler(homothetie)
+
+    def on_homothety_ruler_remove(self):
+        for view in self.doubleRuler.mirrors():
+            view.remove_homothety_ruler()
+
+    def on_mirror_open(self):
+        # Another window on the same state, for a second screen or a projector. The rulers
+        # of both are computed once per change, and drawn once when they have the same size.
+        window = RulerWindow(self.state)
+        window.setAttribute(Qt.WA_DeleteOnClose)
+        window.doubleRuler.copy_view(self.doubleRuler)
+        window.resize(self.size())
+        window.destroyed.connect(lambda: self.mirror_windows.remove(window))
+        self.mirror_windows.append(window)
+        window.show()
+        return window
 
     def on_ruler_value_changed(self):
         homothetie = self.doubleRuler.low_ruler.homothetie
-        self.homothetie_current_label.setText(f'Homothécie actuelle : {homothetie: .2f}')
+        text = f'Homothécie actuelle : {homothetie: .2f}'
+        # Panning and zooming leave the text unchanged, avoid a relayout for those
+        if text != self.homothetie_current_label.text():
+            self.homothetie_current_label.setText(text)
+        if self.exact_button.isChecked() != self.state.exact:
+            self.exact_button.setChecked(self.state.exact)
 
 if __name__ == '__main__':
+    profile = StartupProfile() if '--profile-startup' in sys.argv[1:] else None
+    paint_profiler = None
+    if '--profile-paint' in sys.argv[1:]:
+        from paintProfiler import PaintProfiler
+
+        paint_profiler = PaintProfiler()
+        instrument(paint_profiler)
     app = QApplication(sys.argv)
+    if profile is not None:
+        profile.mark('application')
     window = RulerWindow()
+    if profile is not None:
+        profile.mark('window')
+        profile.watch(window)
+    if paint_profiler is not None:
+        # F3 shows the frame rate and latency over the main ruler
+        main_ruler = window.doubleRuler.main_ruler
+        QShortcut(QKeySequence(Qt.Key_F3), window, lambda: paint_profiler.toggle_overlay(main_ruler))
+        app.aboutToQuit.connect(lambda: paint_profiler.dump(PAINT_PROFILE, label_cache=label_cache.info(),
+                                                            scheduler=main_ruler.state.scheduler.stats()))
+        print(f'Profiling the paints, F3 toggles the overlay, {PAINT_PROFILE} is written on exit')
     window.show()
-    sys.exit(app.exec_())
\ No newline at end of file
+    if '--lesson' in sys.argv[1:]:
+        # Play the steps of a lesson file, see load_lesson
+        arguments = sys.argv[sys.argv.index('--lesson') + 1:]
+        if not arguments:
+            print('--lesson needs the path of a lesson file')
+        else:
+            lesson_path = arguments[0]
+            try:
+                window.doubleRuler.animator.play(load_lesson(lesson_path))
+            except (OSError, ValueError) as error:
+                print(f'The lesson {lesson_path} could not be read: {error}')
+    sys.exit(app.exec_())
@@ -0,0 +1,60 @@
+# -*- mode: python ; coding: utf-8 -*-
+# pyinstaller mainWindow.spec                -> one file, unpacked to a temporary folder on every launch
+# pyinstaller mainWindow.spec -- --onedir    -> one folder, nothing to unpack, faster to start
+import argparse
+import sys
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--onedir', action='store_true')
+options = parser.parse_args()
+
+# Modules the application never imports. QtSvg is only used by exportWorksheets.py.
+EXCLUDED_MODULES = [
+    'tkinter', 'unittest', 'pydoc', 'doctest',
+    'PyQt5.QtBluetooth', 'PyQt5.QtDBus', 'PyQt5.QtDesigner', 'PyQt5.QtHelp', 'PyQt5.QtLocation',
+    'PyQt5.QtMultimedia', 'PyQt5.QtMultimediaWidgets', 'PyQt5.QtNetwork', 'PyQt5.QtNfc', 'PyQt5.QtOpenGL',
+    'PyQt5.QtPositioning', 'PyQt5.QtPrintSupport', 'PyQt5.QtQml', 'PyQt5.QtQuick', 'PyQt5.QtQuickWidgets',
+    'PyQt5.QtRemoteObjects', 'PyQt5.QtSensors', 'PyQt5.QtSerialPort', 'PyQt5.QtSql', 'PyQt5.QtSvg',
+    'PyQt5.QtTest', 'PyQt5.QtTextToSpeech', 'PyQt5.QtWebChannel', 'PyQt5.QtWebSockets', 'PyQt5.QtXml',
+    'PyQt5.QtXmlPatterns',
+]
+# Qt plugin folders kept in the bundle, the others (image formats, print support...) are dropped
+QT_PLUGINS = ('platforms', 'platformthemes', 'styles')
+
+
+def keep(entry):
+    dest = entry[0].replace('\\', '/')
+    if '/Qt5/translations/' in dest:
+        return False
+    if '/Qt5/plugins/' in dest:
+        return dest.split('/Qt5/plugins/', 1)[1].split('/', 1)[0] in QT_PLUGINS
+    return True
+
+
+a = Analysis(
+    ['mainWindow.py'],
+    pathex=[],
+    binaries=[],
+    datas=[],
+    hiddenimports=[],
+    hookspath=[],
+    hooksconfig={},
+    runtime_hooks=[],
+    excludes=EXCLUDED_MODULES,
+    noarchive=False,
+    optimize=0,
+)
+a.binaries = [entry for entry in a.binaries if keep(entry)]
+a.datas = [entry for entry in a.datas if keep(entry)]
+pyz = PYZ(a.pure)
+
+if options.onedir:
+    exe = EXE(pyz, a.scripts, [], exclude_binaries=True, name='mainWindow', debug=False, strip=False, upx=False,
+              console=False)
+    target = COLLECT(exe, a.binaries, a.datas, strip=False, upx=False, name='mainWindow')
+else:
+    target = exe = EXE(pyz, a.scripts, a.binaries, a.datas, [], name='mainWindow', debug=False, strip=False,
+                       upx=False, runtime_tmpdir=None, console=False)
+
+if sys.platform == 'darwin':
+    app = BUNDLE(target, name='mainWindow.app', bundle_identifier=None)
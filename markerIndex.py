@@ -0,0 +1,92 @@
+import csv
+import math
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import groupby
+
+from rulerModel import PADDING, load_numpy
+
+np = load_numpy()
+
+MARKER_LIMIT = 10 ** 6  # Generated sequences cover [-MARKER_LIMIT, MARKER_LIMIT]
+
+
+class MarkerIndex:
+    # Numbers highlighted on the ruler, kept sorted so that a paint only looks at the
+    # visible ones. When there are more visible markers than pixels, they are counted
+    # per pixel column by bisection instead of being positioned one by one.
+
+    def __init__(self, values):
+        # nan and the infinities have no place on the ruler, and nan would not sort
+        if np is not None:
+            values = np.fromiter(values, dtype=float)
+            self.values = np.unique(values[np.isfinite(values)])
+        else:
+            self.values = array('d', sorted(set(v for v in map(float, values) if math.isfinite(v))))
+
+    def __len__(self):
+        return len(self.values)
+
+    @classmethod
+    def multiples(cls, k, limit=MARKER_LIMIT):
+        k = abs(int(k))
+        if k == 0:
+            return cls([0])
+        return cls(range(-(limit // k) * k, limit + 1, k))
+
+    @classmethod
+    def primes(cls, limit=MARKER_LIMIT):
+        # Sieve of Eratosthenes
+        sieve = bytearray([1]) * (limit + 1)
+        sieve[:2] = b'\x00\x00'
+        for n in range(2, math.isqrt(limit) + 1):
+            if sieve[n]:
+                sieve[n * n::n] = bytes(len(range(n * n, limit + 1, n)))
+        return cls(n for n, is_prime in enumerate(sieve) if is_prime)
+
+    @classmethod
+    def from_csv(cls, path):
+        # Every cell holding a number, anywhere in the file
+        values = []
+        with open(path, newline='') as f:
+            for row in csv.reader(f):
+                for cell in row:
+                    try:
+                        values.append(float(cell.replace(',', '.')))
+                    except ValueError:
+                        pass
+        return cls(values)
+
+    def visible(self, low, high):
+        # Slice bounds of the markers within [low, high]
+        if np is not None:
+            return int(np.searchsorted(self.values, low, 'left')), int(np.searchsorted(self.values, high, 'right'))
+        return bisect_left(self.values, low), bisect_right(self.values, high)
+
+    def columns(self, model, scale=1):
+        # Pixel columns holding at least one visible marker, with the number of markers in each
+        low, high = sorted((model.min_value(scale), model.max_value(scale)))
+        first, last = self.visible(low, high)
+        if last - first <= model.width:
+            xs = model.values_to_pixels(self.values[first:last], scale)
+            if np is not None:
+                xs, counts = np.unique(xs, return_counts=True)
+                return xs.tolist(), counts.tolist()
+            runs = [(x, len(list(group))) for x, group in groupby(xs)]
+            return [x for x, _ in runs], [n for _, n in runs]
+
+        # Too many markers: count them between the edges of each pixel column
+        xs = range(PADDING, model.width - PADDING + 1)
+        edges = model.pixels_to_values(range(PADDING, model.width - PADDING + 2), scale)
+        reverse = model.unit_length * scale < 0
+        if reverse:
+            edges = edges[::-1]
+        if np is not None:
+            indices = np.searchsorted(self.values, edges, 'left')
+            counts = np.diff(indices).tolist()
+        else:
+            indices = [bisect_left(self.values, edge) for edge in edges]
+            counts = [b - a for a, b in zip(indices, indices[1:])]
+        if reverse:
+            counts.reverse()
+        return [x for x, n in zip(xs, counts) if n], [n for n in counts if n]
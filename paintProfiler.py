@@ -0,0 +1,188 @@
+import json
+import statistics
+import time
+from bisect import bisect_left
+from collections import deque
+from functools import wraps
+
+from PyQt5.QtCore import Qt, QRectF
+from PyQt5.QtGui import QColor, QPainter
+
+BUCKETS_MS = (0.1, 0.2, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+def histogram(durations):
+    # Number of durations up to each bucket of BUCKETS_MS, the last count is above them all
+    counts = [0] * (len(BUCKETS_MS) + 1)
+    for duration in durations:
+        counts[bisect_left(BUCKETS_MS, duration)] += 1
+    return {'upper_bounds_ms': list(BUCKETS_MS), 'counts': counts}
+
+
+def summarize(durations):
+    durations = sorted(durations)
+    if not durations:
+        return {'samples': 0}
+    return {'median_ms': statistics.median(durations),
+            'mean_ms': statistics.fmean(durations),
+            'p95_ms': durations[min(len(durations) - 1, int(len(durations) * 0.95))],
+            'max_ms': durations[-1],
+            'samples': len(durations),
+            'histogram': histogram(durations)}
+
+
+class PaintProfiler:
+    # Optional instrumentation of the rulers, see mainWindow.py --profile-paint. The
+    # timed methods are wrapped on their class, so nothing is measured otherwise. The
+    # last `size` calls of each method are kept in ring buffers together with the ticks
+    # and labels they drew, as well as the frames of the main ruler, the latency from an
+    # input event to the next frame and the repaints that followed each input event.
+
+    def __init__(self, size=4096):
+        self.calls = {}
+        self.frames = deque(maxlen=size)
+        self.latencies = deque(maxlen=size)
+        self.repaints = deque(maxlen=size)
+        self.size = size
+        self.ticks = 0
+        self.labels = 0
+        self.depth = 0
+        self.last_input = None
+        self.input_time = None
+        self.paints_since_input = 0
+        self.overlay = False
+
+    def record(self, name, duration, ticks=0, labels=0):
+        calls = self.calls.get(name)
+        if calls is None:
+            calls = self.calls[name] = deque(maxlen=self.size)
+        calls.append((duration * 1000, ticks, labels))
+
+    def wrap_calls(self, cls, *names):
+        for name in names:
+            method = cls.__dict__[name]
+            qualified_name = f'{cls.__name__}.{name}'
+
+            def timed(*args, method=method, qualified_name=qualified_name):
+                start = time.perf_counter()
+                try:
+                    return method(*args)
+                finally:
+                    self.record(qualified_name, time.perf_counter() - start)
+
+            setattr(cls, name, wraps(method)(timed))
+
+    def wrap_inputs(self, cls, *names):
+        # Mouse handlers: an event ignored by a ruler reaches its parent as well, it only counts once
+        for name in names:
+            method = cls.__dict__[name]
+            qualified_name = f'{cls.__name__}.{name}'
+
+            def timed(widget, event, method=method, qualified_name=qualified_name):
+                key = (event.type(), widget.mapToGlobal(event.pos()), event.buttons(), event.timestamp())
+                if self.depth == 0 and key != self.last_input:
+                    self.on_input(key)
+                self.depth += 1
+                start = time.perf_counter()
+                try:
+                    return method(widget, event)
+                finally:
+                    self.depth -= 1
+                    self.record(qualified_name, time.perf_counter() - start)
+
+            setattr(cls, name, wraps(method)(timed))
+
+    def wrap_paint(self, cls, frame=False):
+        # frame tells that the paints of cls are the frames of the application, the
+        # overlay is drawn on them
+        method = cls.__dict__['paintEvent']
+        qualified_name = f'{cls.__name__}.paintEvent'
+
+        def timed(widget, event):
+            ticks, labels = self.ticks, self.labels
+            start = time.perf_counter()
+            method(widget, event)
+            end = time.perf_counter()
+            self.record(qualified_name, end - start, self.ticks - ticks, self.labels - labels)
+            self.paints_since_input += 1
+            if frame and type(widget) is cls:
+                self.on_frame(end)
+                if self.overlay:
+                    self.draw_overlay(widget)
+
+        setattr(cls, 'paintEvent', wraps(method)(timed))
+
+    def wrap_counter(self, cls, name, counter, count):
+        # Adds count(*args) to the ticks or labels counter at each call
+        method = cls.__dict__[name]
+
+        def counted(widget, *args):
+            setattr(self, counter, getattr(self, counter) + count(*args))
+            return method(widget, *args)
+
+        setattr(cls, name, wraps(method)(counted))
+
+    def on_input(self, key):
+        if self.last_input is not None:
+            self.repaints.append(self.paints_since_input)
+        self.last_input = key
+        self.paints_since_input = 0
+        if self.input_time is None:
+            self.input_time = time.perf_counter()
+
+    def on_frame(self, end):
+        self.frames.append(end)
+        if self.input_time is not None:
+            self.latencies.append((end - self.input_time) * 1000)
+            self.input_time = None
+
+    def fps(self):
+        # Frames over the last second before the latest one
+        if len(self.frames) < 2:
+            return 0
+        last = self.frames[-1]
+        first = next(t for t in self.frames if t >= last - 1)
+        count = sum(1 for t in self.frames if t >= first) - 1
+        return count / (last - first) if count else 0
+
+    def toggle_overlay(self, widget):
+        self.overlay = not self.overlay
+        widget.update()
+
+    def draw_overlay(self, widget):
+        paints = self.calls.get(f'{type(widget).__name__}.paintEvent', ())
+        recent = [duration for duration, _, _ in list(paints)[-60:]]
+        _, ticks, labels = paints[-1] if paints else (0, 0, 0)
+        latency = self.latencies[-1] if self.latencies else 0
+        repaints = list(self.repaints)[-60:]
+        lines = [f'{self.fps():5.1f} fps   latency {latency:6.1f} ms',
+                 f'paint {max(recent, default=0):6.2f} ms max   {ticks} ticks   {labels} labels',
+                 f'{statistics.fmean(repaints) if repaints else 0:4.2f} repaints per input event']
+
+        painter = QPainter(widget)
+        metrics = painter.fontMetrics()
+        width = max(metrics.width(line) for line in lines) + 8
+        height = metrics.height()
+        painter.fillRect(QRectF(0, 0, width, height * len(lines) + 4), QColor(255, 255, 255, 200))
+        painter.setPen(Qt.darkGreen)
+        for n, line in enumerate(lines):
+            painter.drawText(4, height * (n + 1), line)
+        painter.end()
+
+    def report(self):
+        calls = {}
+        for name, records in sorted(self.calls.items()):
+            calls[name] = summarize([duration for duration, _, _ in records])
+            if name.endswith('paintEvent'):
+                calls[name]['max_ticks'] = max(ticks for _, ticks, _ in records)
+                calls[name]['max_labels'] = max(labels for _, _, labels in records)
+        frames = list(self.frames)
+        return {'calls': calls,
+                'frame_intervals': summarize([(b - a) * 1000 for a, b in zip(frames, frames[1:])]),
+                'input_latency': summarize(self.latencies),
+                'repaints_per_input': statistics.fmean(self.repaints) if self.repaints else 0,
+                'input_events': len(self.repaints)}
+
+    def dump(self, path, **extra):
+        with open(path, 'w') as f:
+            json.dump({'time': time.strftime('%Y-%m-%dT%H:%M:%S'), **self.report(), **extra}, f, indent=2)
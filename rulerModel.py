@@ -0,0 +1,362 @@
+import math
+from array import array
+from fractions import Fraction
+
+np = None  # NumPy once load_numpy() found it
+
+PADDING = 20  # Blank space kept at both ends of the rulers, in pixels
+RECENTER_WIDTHS = 64  # Widths the origin may drift from the view before exact mode moves it
+LABEL_MARGIN = 5
+UNLABELLED_WIDTH = 25  # Room given to each major tick of a ruler without labels, in pixels
+MIN_TICK_SPACING = 6  # Closest two ticks of a minor tier may be, in pixels
+INT64_LIMIT = 2 ** 62  # Integers NumPy computes with, beyond it they stay Python integers
+MIN_HOMOTHETIE = 1e-3  # Smallest homothety in absolute value, a ruler has no scale at 0
+
+
+def load_numpy():
+    # NumPy is optional and takes about as long to import as PyQt5, so it is only
+    # imported on demand: the application loads it once its first frame is shown
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            return None
+        np = numpy
+    return np
+
+
+def nonzero_homothetie(homothetie, sign=1):
+    # The homothety, or the smallest allowed one on its side of 0 (on the side of sign at 0)
+    if abs(homothetie) >= MIN_HOMOTHETIE:
+        return homothetie
+    return math.copysign(MIN_HOMOTHETIE, homothetie if homothetie else sign)
+
+
+def tick_interval_for(span, label_width, available_width):
+    # Smallest interval of the 1, 2, 5, 10, 20, 50, ... ladder such that
+    # (span // interval + 1) labels of label_width fit in available_width
+    max_graduations = max(available_width // (label_width + LABEL_MARGIN), 1)
+    required = abs(span) // max_graduations + 1
+    if required <= 1:
+        return 1
+    power = 10 ** (len(str(required)) - 1)
+    if required == power:
+        return power
+    if required <= 2 * power:
+        return 2 * power
+    if required <= 5 * power:
+        return 5 * power
+    return 10 * power
+
+
+def vectorized(*bounds):
+    # Whether integers between bounds can go through NumPy arrays of int64
+    return np is not None and max(map(abs, bounds)) < INT64_LIMIT
+
+
+def split_offset(zero_offset):
+    # Pixel of zero_offset and the fraction left. Positions are that pixel plus the floored
+    # distance from it, the way mainWindow.TickLayer lays its tiles out, so that the tiles
+    # and the direct drawing round every tick to the same pixel.
+    pixel = math.floor(zero_offset)
+    return pixel, zero_offset - pixel
+
+
+def tick_positions(start, stop, step, zero_offset, unit_length):
+    # Ticks start, start + step, ... before stop, and their x position in pixels
+    pixel, phase = split_offset(zero_offset)
+    if vectorized(start, stop):
+        values = np.arange(start, stop, step, dtype=np.int64)
+        return values.tolist(), (np.floor(values * unit_length + phase).astype(np.int64) + pixel).tolist()
+    values = range(start, stop, step)
+    return values, array('q', [pixel + math.floor(phase + i * unit_length) for i in values])
+
+
+def tick_tiers(interval, pixels_per_unit, max_spacing=math.inf, min_spacing=MIN_TICK_SPACING):
+    # Steps of the minor and sub-minor ticks drawn between the major ones every interval,
+    # coarsest first: the two coarsest steps of the ladder 5, 1, 0.5, 0.1, ... below interval
+    # whose ticks are at most max_spacing pixels apart, so that some show in the view, and
+    # at least min_spacing. Halves and tenths first, finer steps once these leave the view.
+    # Each step divides the coarser ones.
+    digits = str(abs(interval))
+    mantissa, exponent = int(digits[0]), len(digits) - 1
+    steps = []
+    while len(steps) < 2:
+        mantissa, exponent = (5, exponent - 1) if mantissa == 1 else (1, exponent)
+        step = mantissa * Fraction(10) ** exponent
+        if step * abs(pixels_per_unit) < min_spacing:
+            break
+        if step * abs(pixels_per_unit) <= max_spacing:
+            steps.append(step)
+    return steps
+
+
+def tier_positions(anchor, low, high, step, parent, zero_offset, unit_length):
+    # x positions of the multiples of step between anchor + low and anchor + high, on
+    # a ruler whose integer anchor is at zero_offset. The multiples of parent belong to
+    # a coarser tier and are skipped. Positions are computed in steps of 1 / denominator
+    # from the anchor, so they stay exact at any magnitude.
+    step = Fraction(step)
+    numerator, denominator = step.numerator, step.denominator
+    ratio = int(Fraction(parent) / step)
+    base = anchor * denominator
+    start = math.ceil(low * denominator)
+    start += (-base - start) % numerator
+    stop = math.floor(high * denominator) + 1
+    unit_length = unit_length / denominator
+    # The tick start + k * numerator is a multiple of parent when k = skipped modulo ratio
+    skipped = (-(base + start) // numerator) % ratio
+    pixel, phase = split_offset(zero_offset)
+    if vectorized(start, stop):
+        values = np.arange(start, stop, numerator, dtype=np.int64)
+        values = values[np.arange(len(values)) % ratio != skipped]
+        return (np.floor(values * unit_length + phase).astype(np.int64) + pixel).tolist()
+    return array('q', [pixel + math.floor(phase + v * unit_length)
+                       for k, v in enumerate(range(start, stop, numerator)) if k % ratio != skipped])
+
+
+class RulerModel:
+    # Geometry of the rulers, without any Qt: the pixel position of the integer origin
+    # (0 unless exact), the length of one unit of the main ruler and the widget width.
+    # The rulers below the main one are the same axis scaled by homothetie, so every
+    # transform takes the scale of the ruler it is computed for (1 for the main ruler).
+    #
+    # In exact mode the origin follows the view, so zero_offset stays a small float
+    # whatever the magnitude of the visible numbers: positions are computed from
+    # integer differences with the origin and the ticks stay exact at any offset.
+
+    __slots__ = ('zero_offset', 'unit_length', 'homothetie', 'width', 'origin', 'exact')
+
+    def __init__(self, zero_offset, unit_length, homothetie=1, width=640, origin=0, exact=False):
+        self.zero_offset = zero_offset
+        self.unit_length = unit_length
+        self.homothetie = homothetie
+        self.width = width
+        self.origin = origin
+        self.exact = exact
+
+    @classmethod
+    def from_range(cls, min_value, max_value, width=640, exact=False):
+        model = cls(0, 1, width=width, exact=exact)
+        model.set_range(min_value, max_value)
+        return model
+
+    def copy(self):
+        return RulerModel(self.zero_offset, self.unit_length, self.homothetie, self.width, self.origin, self.exact)
+
+    def values(self):
+        return self.zero_offset, self.unit_length, self.homothetie, self.width, self.origin, self.exact
+
+    def set_range(self, min_value, max_value):
+        # Exact bounds may be ints, Fractions or Decimals of any magnitude
+        origin = math.floor(min_value) if self.exact else 0
+        self.unit_length = (self.width - 2 * PADDING) / float(max_value - min_value)
+        self.zero_offset = PADDING - float(min_value - origin) * self.unit_length
+        self.origin = origin
+
+    def set_width(self, width):
+        # Keep the visible range of the main ruler, relative to the origin
+        low = (PADDING - self.zero_offset) / self.unit_length
+        high = (self.width - PADDING - self.zero_offset) / self.unit_length
+        self.width = width
+        self.unit_length = (width - 2 * PADDING) / (high - low)
+        self.zero_offset = PADDING - low * self.unit_length
+
+    def set_exact(self, exact):
+        if exact:
+            self.exact = True
+            self.recenter()
+        else:
+            self.zero_offset -= self.origin * self.unit_length
+            self.origin = 0
+            self.exact = False
+
+    def recenter(self, slack=0):
+        # Move the origin to the integer at the middle of the view, which does not move,
+        # once it is more than slack widths away. Panning keeps the cached tiles, which
+        # are laid out from the origin, until it has drifted that far.
+        if not self.exact or abs(self.width / 2 - self.zero_offset) <= slack * self.width:
+            return False
+        shift = round((self.width / 2 - self.zero_offset) / self.unit_length)
+        if shift == 0:
+            return False
+        self.origin += shift
+        self.zero_offset += shift * self.unit_length
+        return True
+
+    def anchor(self, scale=1):
+        # An integer of the ruler of this scale near the origin, and its pixel position
+        if self.origin == 0:
+            return 0, self.zero_offset
+        if scale == int(scale):
+            scale = int(scale)
+            anchor = self.origin // scale
+            return anchor, self.zero_offset + (anchor * scale - self.origin) * self.unit_length
+        scale = Fraction(scale)
+        anchor = math.floor(self.origin / scale)
+        return anchor, self.zero_offset + float(anchor * scale - self.origin) * self.unit_length
+
+    def min_value(self, scale=1):
+        return self.pixel_to_value(PADDING, scale)
+
+    def max_value(self, scale=1):
+        return self.pixel_to_value(self.width - PADDING, scale)
+
+    def value_to_pixel(self, value, scale=1):
+        anchor, x_anchor = self.anchor(scale)
+        return x_anchor + float(value - anchor) * self.unit_length * scale
+
+    def pixel_to_value(self, x, scale=1):
+        # A float, only exact as long as the visible numbers are below 2 ** 53
+        anchor, x_anchor = self.anchor(scale)
+        return anchor + (x - x_anchor) / (self.unit_length * scale)
+
+    def in_view(self, value, scale=1):
+        # Whether value lies between the padded ends, compared with the anchor as an exact
+        # difference: min_value and max_value are floats that round the ends beyond 2 ** 53
+        anchor, x_anchor = self.anchor(scale)
+        unit_length = self.unit_length * scale
+        low, high = sorted(((PADDING - x_anchor) / unit_length, (self.width - PADDING - x_anchor) / unit_length))
+        return low <= value - anchor <= high
+
+    def values_to_pixels(self, values, scale=1):
+        # Floored pixel positions of a batch of values, exact for a range of integers
+        anchor, x_anchor = self.anchor(scale)
+        pixel, phase = split_offset(x_anchor)
+        unit_length = self.unit_length * scale
+        if isinstance(values, range):
+            values = range(values.start - anchor, values.stop - anchor, values.step)
+            anchor = 0
+            if not vectorized(values.start, values.stop):
+                return array('q', [pixel + math.floor(phase + v * unit_length) for v in values])
+        if np is not None:
+            return np.floor((np.asarray(values) - anchor) * unit_length + phase).astype(np.int64) + pixel
+        return array('q', [pixel + math.floor(phase + (v - anchor) * unit_length) for v in values])
+
+    def pixels_to_values(self, xs, scale=1):
+        anchor, x_anchor = self.anchor(scale)
+        unit_length = self.unit_length * scale
+        if np is not None:
+            return (np.asarray(xs, dtype=float) - x_anchor) / unit_length + anchor
+        return array('d', [anchor + (x - x_anchor) / unit_length for x in xs])
+
+    def integer_range(self, scale=1):
+        # First and last integers drawn by range(min_integer, max_integer + 1, step), also
+        # when the ruler is reversed by a negative homothety. The ends of the view are
+        # anchor + low and anchor + high, rounded without going through a float.
+        anchor, x_anchor = self.anchor(scale)
+        unit_length = self.unit_length * scale
+        low = (PADDING - x_anchor) / unit_length
+        high = (self.width - PADDING - x_anchor) / unit_length
+        if low < high:
+            min_integer = anchor + (math.ceil(low) if low <= -anchor else math.floor(low) + 1)
+            max_integer = anchor + (math.ceil(high) - 1 if high <= -anchor else math.floor(high))
+        else:
+            min_integer = anchor + (math.ceil(low) - 1 if low <= -anchor else math.floor(low))
+            max_integer = anchor + (math.ceil(high) - 2 if high <= -anchor else math.floor(high) - 1)
+        return min_integer, max_integer
+
+    def tick_interval(self, label_width, scale=1):
+        # Signed interval between labelled ticks, negative on a reversed ruler
+        min_integer, max_integer = self.integer_range(scale)
+        interval = tick_interval_for(max_integer - min_integer, label_width, self.width)
+        if self.unit_length * scale > 0:
+            return interval
+        return -interval
+
+    def tick_tiers(self, interval, scale=1):
+        # (step, parent) of the minor tiers drawn between the ticks of interval
+        steps = tick_tiers(interval, self.unit_length * scale, self.width - 2 * PADDING)
+        return list(zip(steps, [abs(interval)] + steps))
+
+    def tier_ticks(self, step, parent, scale=1):
+        # Pixel positions of the visible ticks of a minor tier
+        anchor, x_anchor = self.anchor(scale)
+        unit_length = self.unit_length * scale
+        low, high = sorted(((PADDING - x_anchor) / unit_length, (self.width - PADDING - x_anchor) / unit_length))
+        return tier_positions(anchor, low, high, step, parent, x_anchor, unit_length)
+
+    def ticks(self, interval, scale=1):
+        # Values and pixel positions of the visible multiples of interval
+        min_integer, max_integer = self.integer_range(scale)
+        start = min_integer + ((-min_integer) % interval)
+        if scale == int(scale):
+            # Tick i is the integer i * scale of the main ruler, placed the same way
+            scale = int(scale)
+            _, xs = tick_positions(start * scale - self.origin, (max_integer + 1) * scale - self.origin,
+                                   interval * scale, self.zero_offset, self.unit_length)
+        else:
+            anchor, x_anchor = self.anchor(scale)
+            _, xs = tick_positions(start - anchor, max_integer + 1 - anchor, interval, x_anchor,
+                                   self.unit_length * scale)
+        return range(start, max_integer + 1, interval), xs
+
+
+class FrameGeometry:
+    # Geometry of one frame, computed once for every ruler drawn from the same model,
+    # in every window showing it. It keeps the pixel position of each visible integer of
+    # the main ruler: a ruler with an integer homothety h finds its tick i at the position
+    # of i * h there, so stacking more rulers only costs a lookup. Results are memoized
+    # per scale.
+
+    __slots__ = ('model', 'main_first', 'main_xs', 'integer_ranges', 'intervals', 'tick_cache', 'tier_cache')
+
+    def __init__(self, model):
+        self.model = model.copy()
+        self.integer_ranges = {}
+        self.intervals = {}
+        self.tick_cache = {}
+        self.tier_cache = {}
+        first, last = self.integer_range()
+        self.main_first = first
+        self.main_xs = None
+        if 0 <= last - first <= model.width:
+            self.main_xs = model.values_to_pixels(range(first, last + 1))
+
+    def integer_range(self, scale=1):
+        integer_range = self.integer_ranges.get(scale)
+        if integer_range is None:
+            integer_range = self.integer_ranges[scale] = self.model.integer_range(scale)
+        return integer_range
+
+    def tick_interval(self, label_width, scale=1):
+        key = (label_width, scale)
+        interval = self.intervals.get(key)
+        if interval is None:
+            interval = self.intervals[key] = self.model.tick_interval(label_width, scale)
+        return interval
+
+    def ticks(self, interval, scale=1):
+        key = (interval, scale)
+        ticks = self.tick_cache.get(key)
+        if ticks is None:
+            ticks = self.tick_cache[key] = self.main_ticks(interval, scale) or self.model.ticks(interval, scale)
+        return ticks
+
+    def tiers(self, interval, scale=1):
+        # Pixel positions of the ticks of each minor tier, coarsest first
+        key = (interval, scale)
+        tiers = self.tier_cache.get(key)
+        if tiers is None:
+            tiers = self.tier_cache[key] = [self.model.tier_ticks(step, parent, scale)
+                                            for step, parent in self.model.tick_tiers(interval, scale)]
+        return tiers
+
+    def main_ticks(self, interval, scale):
+        # Ticks looked up among the main ruler positions, None when they are not all there
+        if self.main_xs is None or scale != int(scale):
+            return None
+        scale = int(scale)
+        min_integer, max_integer = self.integer_range(scale)
+        values = range(min_integer + ((-min_integer) % interval), max_integer + 1, interval)
+        if not values:
+            return values, []
+        ends = (values[0] * scale - self.main_first, values[-1] * scale - self.main_first)
+        if min(ends) < 0 or max(ends) >= len(self.main_xs):
+            return None
+        # main_xs is an array when NumPy was loaded after this geometry was computed
+        if np is not None and not isinstance(self.main_xs, array):
+            indices = np.arange(len(values), dtype=np.int64) * (values.step * scale) + ends[0]
+            return values, self.main_xs[indices].tolist()
+        return values, [self.main_xs[i * scale - self.main_first] for i in values]
@@ -0,0 +1,36 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import functionMap
+import markerIndex
+import rulerModel
+
+NUMPY_MODULES = (rulerModel, markerIndex, functionMap)
+
+
+@pytest.fixture(params=['numpy', 'python'])
+def numpy_path(request, monkeypatch):
+    # Runs a test with NumPy, then with the pure Python fallbacks
+    if request.param == 'numpy':
+        np = rulerModel.load_numpy()
+        if np is None:
+            pytest.skip('NumPy is not installed')
+        for module in NUMPY_MODULES:
+            monkeypatch.setattr(module, 'np', np)
+    else:
+        for module in NUMPY_MODULES:
+            monkeypatch.setattr(module, 'np', None)
+    return request.param
+
+
+@pytest.fixture(scope='session')
+def qapp():
+    # The widgets and fonts need an application, offscreen as in the benchmarks
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt5.QtWidgets import QApplication
+
+    return QApplication.instance() or QApplication([])
@@ -0,0 +1,49 @@
+import json
+import re
+
+import pytest
+
+from exportWorksheets import load_jobs, normalize_job
+
+
+def test_normalize_job_defaults():
+    job = normalize_job({'output': 'fiche.PNG'}, 1)
+    assert job['format'] == 'png'
+    assert (job['min'], job['max']) == (-10, 10)
+    assert job['show_labels'] is True
+    assert job['homotheties'] == [1] and job['show_homothety'] is False
+    assert (job['width'], job['height']) == (1000, 90)
+
+
+def test_normalize_job_homotheties():
+    job = normalize_job({'output': 'fiche.svg', 'homotheties': '2; -0.5 3'}, 1)
+    assert job['homotheties'] == [2, -0.5, 3]
+    assert job['show_homothety'] is True
+    assert job['height'] == 90 + 110 * 3
+    job = normalize_job({'output': 'fiche.pdf', 'homothetie': '4', 'show_labels': 'non'}, 1)
+    assert job['homotheties'] == [4] and job['show_homothety'] is True
+    assert job['show_labels'] is False
+
+
+@pytest.mark.parametrize('row, message', [
+    ({'output': 'a.png', 'colour': 'red'}, 'job 3: unknown field(s) colour'),
+    ({'format': 'png'}, 'job 3: no output file'),
+    ({'output': 'a.gif'}, "job 3: unknown format 'gif'"),
+    ({'output': 'a.png', 'min': 5, 'max': 5}, 'job 3: min 5.0 must be less than max 5.0'),
+    ({'output': 'a.png', 'min': 8, 'max': -8}, 'job 3: min 8.0 must be less than max -8.0'),
+    ({'output': 'a.png', 'min': 'nan'}, 'job 3: min and max must be finite'),
+    ({'output': 'a.png', 'max': 'inf'}, 'job 3: min and max must be finite'),
+])
+def test_normalize_job_errors(row, message):
+    with pytest.raises(ValueError, match=re.escape(message)):
+        normalize_job(row, 3)
+
+
+def test_load_jobs_reports_the_job_number(tmp_path):
+    path = tmp_path / 'jobs.csv'
+    path.write_text('output,min,max\na.png,-3,3\nb.png,2,1\n', encoding='utf-8')
+    with pytest.raises(ValueError, match='job 2: min'):
+        load_jobs(str(path))
+    path = tmp_path / 'jobs.json'
+    path.write_text(json.dumps([{'output': 'a.svg', 'min': -3, 'max': 3}]), encoding='utf-8')
+    assert [(job['format'], job['min'], job['max']) for job in load_jobs(str(path))] == [('svg', -3, 3)]
@@ -0,0 +1,33 @@
+import pytest
+
+from functionMap import FunctionMap
+from rulerModel import INT64_LIMIT
+
+pytestmark = pytest.mark.usefixtures('numpy_path')
+
+
+@pytest.mark.parametrize('text, function', [
+    ('n ** 3', lambda n: n ** 3),
+    ('n ** 2 - 7n', lambda n: n ** 2 - 7 * n),
+    ('n // 2 si n % 2 == 0 sinon 3n + 1', lambda n: n // 2 if n % 2 == 0 else 3 * n + 1),
+    ('2 ** 64 + n', lambda n: 2 ** 64 + n),
+    ('18446744073709551616 * n', lambda n: 18446744073709551616 * n),
+    ('100 // n', lambda n: 100 // n if n else None),
+])
+def test_function_images(text, function):
+    # n ** 3 leaves int64 beyond 2097151, the constants are beyond it from the start
+    values = range(-3000000, 3000000, 997)
+    images = FunctionMap(text).images(values)
+    assert [None if image is None else int(image) for image in images] == [function(n) for n in values]
+
+
+def test_function_images_off_the_multiples():
+    # A range that does not start on a multiple of its step
+    values = range(1, 5000, 3)
+    assert [int(image) for image in FunctionMap('n mod 7').images(values)] == [n % 7 for n in values]
+
+
+def test_function_images_beyond_int64():
+    values = range(INT64_LIMIT - 5, INT64_LIMIT + 5)
+    images = FunctionMap('n + 1').images(values)
+    assert [int(image) for image in images] == [n + 1 for n in values]
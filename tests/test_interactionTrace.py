@@ -0,0 +1,36 @@
+import json
+
+import pytest
+
+from interactionTrace import TRACE_VERSION, compare_states, load_trace
+
+
+def test_compare_states():
+    expected = {'zero_offset': 20.5, 'origin': 10 ** 30, 'exact': True, 'homotheties': [2, -1], 'markers': None}
+    assert compare_states(expected, dict(expected, zero_offset=20.5 + 1e-12)) == []
+    assert compare_states(expected, dict(expected, zero_offset=20)) == ['zero_offset']
+    assert compare_states(expected, dict(expected, origin=10 ** 30 + 1, markers=5)) == ['origin', 'markers']
+    assert compare_states(expected, {'zero_offset': 20.5}) == ['origin', 'exact', 'homotheties']
+    assert compare_states({'unit_length': 0.0}, {'unit_length': 1e-12}) == []
+
+
+def write_trace(path, records):
+    lines = [{'version': TRACE_VERSION, 'width': 900, 'height': 400}, *records]
+    path.write_text(''.join(json.dumps(line) + '\n' for line in lines))
+    return str(path)
+
+
+def test_load_trace(tmp_path):
+    records = [{'t': 1.5, 'widget': 'button:Montrer graduation', 'type': 'press', 'x': 3, 'y': 4,
+                'button': 1, 'buttons': 1, 'modifiers': 0},
+               {'t': 2.5, 'type': 'resize', 'width': 1000, 'height': 400}]
+    header, loaded = load_trace(write_trace(tmp_path / 'trace.jsonl', records))
+    assert header['width'] == 900 and loaded == records
+
+
+def test_load_trace_refuses_the_file_dialog(tmp_path):
+    records = [{'t': 1.5, 'type': 'resize', 'width': 1000, 'height': 400},
+               {'t': 9, 'widget': 'button:Charger un fichier CSV', 'type': 'press', 'x': 3, 'y': 4,
+                'button': 1, 'buttons': 1, 'modifiers': 0}]
+    with pytest.raises(ValueError, match='event 2 is on button:Charger un fichier CSV'):
+        load_trace(write_trace(tmp_path / 'trace.jsonl', records))
@@ -0,0 +1,122 @@
+import json
+
+import pytest
+from PyQt5.QtGui import QColor, QFont
+
+from mainWindow import (FrameScheduler, LabelCache, RulerState, RulerWidget, integer_label, load_lesson,
+                        prod_label)
+
+pytestmark = pytest.mark.usefixtures('qapp')
+
+
+def test_label_cache_counts_hits_and_misses():
+    cache = LabelCache()
+    font = QFont()
+    text, width = cache.get(12, None, font)
+    assert text == integer_label(12) and width > 0
+    assert cache.get(12, None, font) == (text, width)
+    assert cache.get(12, 3, font)[0] == prod_label(12, 3)
+    assert cache.info() == {'hits': 1, 'misses': 2, 'size': 2, 'max_size': 4096}
+
+
+def test_label_cache_drops_the_least_recently_used():
+    cache = LabelCache(max_size=3)
+    font = QFont()
+    for value in (1, 2, 3):
+        cache.get(value, None, font)
+    cache.get(1, None, font)
+    cache.get(4, None, font)
+    assert [key[0] for key in cache.entries] == [3, 1, 4]
+
+    cache.set_max_size(1)
+    assert [key[0] for key in cache.entries] == [4]
+    cache.clear()
+    assert cache.info() == {'hits': 0, 'misses': 0, 'size': 0, 'max_size': 1}
+
+
+def test_label_cache_keys_the_font():
+    cache = LabelCache()
+    small, large = QFont(), QFont()
+    small.setPointSize(8)
+    large.setPointSize(30)
+    assert cache.get(1000, None, small)[1] < cache.get(1000, None, large)[1]
+    assert cache.misses == 2
+
+
+def test_frame_scheduler_runs_the_latest_callback_per_key():
+    scheduler = FrameScheduler()
+    calls = []
+    for x in range(5):
+        scheduler.schedule('pan', lambda x=x: calls.append(('pan', x)))
+    scheduler.schedule('zoom', lambda: calls.append(('zoom', 1)))
+    assert scheduler.timer.isActive()
+    assert calls == []
+
+    scheduler.on_frame()
+    assert calls == [('pan', 4), ('zoom', 1)]
+    assert scheduler.stats()['frames'] == 1
+    assert scheduler.stats()['coalesced_events'] == 4
+
+    # A frame with nothing pending stops the timer until the next change
+    scheduler.on_frame()
+    assert not scheduler.timer.isActive()
+    assert calls == [('pan', 4), ('zoom', 1)]
+
+
+def test_frame_scheduler_flush():
+    scheduler = FrameScheduler()
+    calls = []
+    scheduler.schedule('pan', lambda: calls.append(1))
+    scheduler.flush()
+    scheduler.flush()
+    assert calls == [1]
+
+
+def red_columns(ruler):
+    image = ruler.grab().toImage()
+    return {x for x in range(image.width()) for y in range(image.height())
+            if QColor(image.pixel(x, y)).red() > 200 and QColor(image.pixel(x, y)).green() < 100}
+
+
+@pytest.mark.parametrize('origin', [10 ** 20, 10 ** 30])
+def test_special_number_drawn_beyond_float_precision(origin):
+    ruler = RulerWidget(state=RulerState(origin, origin + 20, exact=True))
+    ruler.resize(640, 60)
+    ruler.showSpecialNumber(origin + 10)
+    assert 320 in red_columns(ruler)
+    ruler.showSpecialNumber(origin + 21)
+    assert not red_columns(ruler)
+
+
+def write_lesson(tmp_path, steps):
+    path = tmp_path / 'lesson.json'
+    path.write_text(json.dumps(steps), encoding='utf-8')
+    return str(path)
+
+
+def test_load_lesson(tmp_path):
+    steps = [{'homothetie': -2.5, 'duration': 0}, {'range': ['-1/3', 10 ** 20]},
+             {'number': '123456789012345678901', 'homothetie': 3}, {'pause': 500}]
+    assert load_lesson(write_lesson(tmp_path, steps)) == steps
+
+
+@pytest.mark.parametrize('steps, message', [
+    ({'homothetie': 2}, 'a lesson is a list of steps'),
+    ([{'homothetie': 2}, 3], 'a lesson is a list of steps'),
+    ([{'pause': 10}, {'zoom': 2}], 'step 2: unknown key(s) zoom'),
+    ([{'homothetie': '2'}], "step 1: the homothety '2' is not a number"),
+    ([{'homothetie': True}], 'step 1: the homothety True is not a number'),
+    ([{'range': [5, 5]}], 'step 1: the range [5, 5] is empty'),
+    ([{'range': [5, -5]}], 'step 1: the range [5, -5] is empty'),
+    ([{'range': [1, 2, 3]}], 'step 1: a range is a list of two numbers'),
+    ([{'range': 5}], 'step 1: a range is a list of two numbers'),
+    ([{'range': [0, 'dix']}], "step 1: 'dix' is not a number"),
+    ([{'number': 'nan'}], "step 1: 'nan' is not a number"),
+    ([{'number': False}], 'step 1: False is not a number'),
+    ([{'pause': -1}], 'step 1: the pause -1 is not a number of ms'),
+    ([{'number': 3, 'duration': 0.5}], 'step 1: the duration 0.5 is not a number of ms'),
+])
+def test_load_lesson_errors(tmp_path, steps, message):
+    with pytest.raises(ValueError) as error:
+        load_lesson(write_lesson(tmp_path, steps))
+    assert str(error.value) == message
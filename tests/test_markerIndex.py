@@ -0,0 +1,47 @@
+import math
+
+import pytest
+
+from markerIndex import MarkerIndex
+from rulerModel import PADDING, RulerModel
+
+pytestmark = pytest.mark.usefixtures('numpy_path')
+
+
+def test_marker_columns():
+    # 1 and 1.001 share a pixel column, 50 is out of view
+    model = RulerModel.from_range(0, 10)
+    xs, counts = MarkerIndex([1, 1.001, 2, 50]).columns(model)
+    assert list(xs) == [80, 140]
+    assert list(counts) == [2, 1]
+
+
+@pytest.mark.parametrize('scale', [1, -1])
+def test_marker_columns_beyond_one_per_pixel(scale):
+    # Each column counts the markers from its left edge to the next one
+    model = RulerModel.from_range(-50000, 50000)
+    markers = MarkerIndex.multiples(3)
+    low, high = sorted(model.pixels_to_values([PADDING, model.width - PADDING + 1], scale))
+    xs, counts = markers.columns(model, scale)
+    assert len(xs) == model.width - 2 * PADDING + 1
+    assert sum(counts) == len(range(math.ceil(low / 3), math.ceil(high / 3)))
+    assert list(xs) == sorted(xs)
+    assert PADDING <= xs[0] and xs[-1] <= model.width - PADDING
+    assert all(n > 0 for n in counts)
+
+
+def test_markers_from_csv(tmp_path):
+    # Any numeric cell, French decimal commas included; nan and the infinities are left out
+    path = tmp_path / 'markers.csv'
+    path.write_text('5,nan,1,3,inf,2\nnom;x\n"2,5",-infinity\n', encoding='utf-8')
+    markers = MarkerIndex.from_csv(str(path))
+    assert list(markers.values) == [1, 2, 2.5, 3, 5]
+    xs, counts = markers.columns(RulerModel.from_range(0, 10))
+    assert list(xs) == [80, 140, 170, 200, 320]
+    assert list(counts) == [1, 1, 1, 1, 1]
+
+
+def test_multiples_and_primes():
+    assert list(MarkerIndex.multiples(4, 10).values) == [-8, -4, 0, 4, 8]
+    assert list(MarkerIndex.multiples(0).values) == [0]
+    assert list(MarkerIndex.primes(30).values) == [2, 3, 5, 7, 11, 13, 17, 19, 23, 29]
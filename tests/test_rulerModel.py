@@ -0,0 +1,114 @@
+import math
+import random
+from fractions import Fraction
+
+import pytest
+
+from rulerModel import LABEL_MARGIN, RulerModel, tick_interval_for, tick_positions, tick_tiers, tier_positions
+
+pytestmark = pytest.mark.usefixtures('numpy_path')
+
+
+def truncated_range(min_value, max_value):
+    # min_integer and max_integer as the first version of the rulers rounded them, with int()
+    if min_value < max_value:
+        low = int(min_value) if min_value <= 0 else int(min_value) + 1
+        high = int(max_value) - 1 if max_value <= 0 else int(max_value)
+    else:
+        low = int(min_value) - 1 if min_value <= 0 else int(min_value)
+        high = int(max_value) - 2 if max_value <= 0 else int(max_value) - 1
+    return low, high
+
+
+@pytest.mark.parametrize('span, expected', [(0, 1), (17, 1), (18, 2), (36, 5), (89, 5), (90, 10), (179, 10),
+                                            (180, 20), (10 ** 40, 10 ** 39)])
+def test_tick_interval_for(span, expected):
+    assert tick_interval_for(span, 30, 640) == expected
+
+
+def test_tick_interval_for_is_the_smallest_that_fits():
+    ladder = [m * 10 ** e for e in range(6) for m in (1, 2, 5)]
+    for span in range(0, 100000, 7):
+        interval = tick_interval_for(span, 30, 640)
+        fits = [i for i in ladder if (span // i + 1) * (30 + LABEL_MARGIN) <= 640]
+        assert interval == fits[0]
+
+
+def test_integer_range_truncates_like_the_first_version():
+    rng = random.Random(7)
+    for _ in range(2000):
+        low = rng.uniform(-500, 500)
+        high = low + rng.choice([0.3, 1, 7.5, 100, 999])
+        if rng.random() < 0.2:
+            low, high = round(low), round(high) + 1
+        model = RulerModel.from_range(low, high)
+        for scale in (1, -1, 2, -3, 0.5):
+            assert model.integer_range(scale) == truncated_range(model.min_value(scale), model.max_value(scale))
+
+
+def test_integer_range_of_a_reversed_ruler():
+    # The ticks are range(min_integer, max_integer + 1, -step): the integers of the view from right to left
+    model = RulerModel.from_range(-9.5, 9.5)
+    min_integer, max_integer = model.integer_range(-1)
+    assert list(range(min_integer, max_integer + 1, -1)) == list(range(9, -10, -1))
+
+
+def test_tick_positions():
+    values, xs = tick_positions(-4, 5, 2, 10.5, 7.25)
+    assert list(values) == [-4, -2, 0, 2, 4]
+    assert list(xs) == [math.floor(10.5 + v * 7.25) for v in values]
+
+
+def test_tick_tiers():
+    assert tick_tiers(1, 1000, 1320) == [Fraction(1, 2), Fraction(1, 10)]
+    assert tick_tiers(1, 67368, 1320) == [Fraction(1, 100), Fraction(1, 200)]
+    assert tick_tiers(10, 30) == [5, 1]
+    assert tick_tiers(1, 5) == []
+
+
+def test_tier_positions_skip_the_coarser_tier():
+    xs = tier_positions(0, 0, 2, Fraction(1, 10), Fraction(1, 2), 0.25, 100)
+    assert list(xs) == [math.floor(0.25 + k * 10) for k in range(21) if k % 5]
+
+
+@pytest.mark.parametrize('anchor', [10 ** 20, -3 * 10 ** 40])
+def test_tier_positions_far_from_zero(anchor):
+    # anchor - 1/2 and anchor + 1/2, placed from the anchor without losing them to floats
+    assert list(tier_positions(anchor, -1, 1, Fraction(1, 2), 1, 300.5, 100)) == [250, 350]
+
+
+def test_exact_anchor():
+    origin = 10 ** 30
+    model = RulerModel.from_range(origin, origin + 20, exact=True)
+    assert model.origin == origin
+    assert model.anchor() == (origin, 20.0)
+    assert model.integer_range() == (origin + 1, origin + 20)
+    values, xs = model.ticks(5)
+    assert values == range(origin + 5, origin + 21, 5)
+    assert list(xs) == [170, 320, 470, 620]
+
+    anchor, x_anchor = model.anchor(3)
+    assert anchor == origin // 3
+    assert x_anchor == 20.0 + (anchor * 3 - origin) * model.unit_length
+    values, xs = model.ticks(1, 3)
+    assert values == range(origin // 3 + 1, origin // 3 + 8)
+    assert list(xs) == [math.floor(20.0 + (v * 3 - origin) * model.unit_length) for v in values]
+
+
+@pytest.mark.parametrize('origin', [10 ** 20, 10 ** 30])
+def test_in_view_beyond_float_precision(origin):
+    # min_value and max_value both round to float(origin) there
+    model = RulerModel.from_range(origin, origin + 20, exact=True)
+    assert model.in_view(origin) and model.in_view(origin + 20) and model.in_view(origin + Fraction(1, 3))
+    assert not model.in_view(origin - 1) and not model.in_view(origin + 21)
+    assert model.in_view(origin // 3 + 1, 3) and model.in_view(origin // 3 + 7, 3)
+    assert not model.in_view(origin // 3, 3) and not model.in_view(origin // 3 + 8, 3)
+    assert model.in_view(-(origin // 2) - 10, -2) and not model.in_view(-(origin // 2) - 11, -2)
+    assert model.in_view(-(origin // 2), -2) and not model.in_view(-(origin // 2) + 1, -2)
+
+
+def test_values_to_pixels_match_the_ticks():
+    model = RulerModel.from_range(-7.3, 12.9, width=1000)
+    values, xs = model.ticks(1)
+    assert list(model.values_to_pixels(values)) == list(xs)
+    assert list(model.values_to_pixels(list(values))) == list(xs)